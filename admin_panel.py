@@ -0,0 +1,98 @@
+# admin_panel.py
+"""
+Trang quản trị ẩn (dùng chung cho quanlyvanban.py và qlvbdrive.py): số liệu
+hiệu năng của tiến trình (metrics), tải về dạng Prometheus / JSON-lines,
+và chạy cProfile cho 1 lượt chạy lại.
+
+Mở bằng ?admin=<ADMIN_TOKEN> trên URL. Chưa cấu hình ADMIN_TOKEN (env / secrets)
+thì trang quản trị luôn tắt.
+
+Trong app:
+    _run = admin_panel.begin_run()          # đầu script
+    ...
+    admin_panel.end_run("quanlyvanban", _run)  # cuối script
+"""
+import hmac
+import time
+
+import streamlit as st
+
+import metrics
+from common import setting
+
+# Cờ trong session_state: lượt chạy sau sẽ được cProfile
+_PROFILE_NEXT = "_admin_profile_next"
+_PROFILE = "_admin_profile"
+
+
+def enabled() -> bool:
+    """Chỉ mở khi ?admin= đúng ADMIN_TOKEN; không có ADMIN_TOKEN thì luôn tắt."""
+    token = setting("ADMIN_TOKEN")
+    val = st.query_params.get("admin")
+    if not token or not val:
+        return False
+    return hmac.compare_digest(str(val).encode(), str(token).encode())
+
+
+def begin_run() -> float:
+    """Đầu lượt chạy: bật cProfile nếu admin đã yêu cầu, trả về mốc thời gian."""
+    # Lượt trước bị ngắt giữa chừng (st.rerun / st.stop) -> tắt profiler còn bật
+    leftover = st.session_state.pop(_PROFILE, None)
+    if leftover is not None:
+        leftover.disable()
+    if st.session_state.pop(_PROFILE_NEXT, False):
+        st.session_state[_PROFILE] = metrics.start_profile()
+    return time.perf_counter()
+
+
+def end_run(app: str, started: float) -> None:
+    """Cuối lượt chạy: ghi span "<app>.rerun", dừng cProfile, vẽ trang admin nếu được mở."""
+    metrics.observe(f"{app}.rerun", (time.perf_counter() - started) * 1000)
+    prof = st.session_state.pop(_PROFILE, None)
+    if prof is not None:
+        metrics.stop_profile(prof)
+    if enabled():
+        render()
+
+
+def render() -> None:
+    snap = metrics.snapshot()
+    st.markdown("---")
+    st.subheader("🛠️ Quản trị — số liệu hiệu năng")
+    st.caption(f"Tiến trình đã chạy {snap['uptime_s']:.0f} giây. Thời gian tính bằng mili giây.")
+
+    spans = [
+        {
+            "Span": name,
+            "Số lần": s["count"],
+            "TB (ms)": round(s["avg_ms"], 1),
+            "Gần nhất (ms)": round(s["last_ms"], 1),
+            "Max (ms)": round(s["max_ms"], 1),
+            "Tổng (ms)": round(s["total_ms"], 1),
+        }
+        for name, s in sorted(snap["spans"].items(), key=lambda x: -x[1]["total_ms"])
+    ]
+    st.markdown("**Thời gian theo bước**")
+    st.dataframe(spans, hide_index=True, width="stretch")
+    st.markdown("**Lệnh gọi API / dữ liệu truyền**")
+    st.dataframe(snap["counters"], hide_index=True, width="stretch")
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.download_button(
+        "⬇️ Prometheus", data=metrics.prometheus_text, file_name="metrics.prom",
+        mime="text/plain", on_click="ignore",
+    )
+    c2.download_button(
+        "⬇️ JSON lines", data=metrics.jsonl_snapshot, file_name="metrics.jsonl",
+        mime="application/x-ndjson", on_click="ignore",
+    )
+    if c3.button("🧪 Profile lượt chạy sau", help="Chạy lại trang 1 lần với cProfile"):
+        st.session_state[_PROFILE_NEXT] = True
+        st.rerun()
+    if c4.button("♻️ Xóa số liệu"):
+        metrics.reset()
+        st.rerun()
+
+    if metrics.last_profile:
+        with st.expander("cProfile — lượt chạy được profile gần nhất"):
+            st.code(metrics.last_profile, language="text")
@@ -0,0 +1,133 @@
+# bench_startup.py
+"""
+Đo thời gian khởi động của các app Streamlit bằng `python -X importtime`:
+import các module mà app import ở đầu file trong 1 tiến trình mới, cộng
+thời gian "cumulative" của các import cấp cao nhất, lấy trung vị qua nhiều lần.
+Đồng thời báo SDK nặng (dropbox, googleapiclient, pandas ...) có bị import
+ngay lúc khởi động hay không.
+
+--render: đo thêm thời gian tới lần vẽ trang đầu tiên của quanlyvanban.py
+(streamlit AppTest, backend "local", CSDL tạm) – tính từ lúc mở tiến trình.
+
+Chạy:  python bench_startup.py --runs 5 --top 8 [--render]
+"""
+import os
+import re
+import ast
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APPS = ("quanlyvanban.py", "qlvbdrive.py")
+# Không nên bị import trước khi trang được vẽ
+HEAVY = ("dropbox", "googleapiclient", "google.oauth2", "httplib2", "pandas", "pyarrow", "openpyxl")
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def _top_level_imports(path: str) -> list[str]:
+    """Các module (tuyệt đối) được import ở cấp module của file."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    mods = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            mods.extend(a.name for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            mods.append(node.module)
+    return list(dict.fromkeys(mods))
+
+
+def _importtime(modules: list[str]) -> tuple[int, dict[str, int]]:
+    """1 tiến trình mới: (tổng µs các import cấp cao nhất, {package: cumulative µs})."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    total, packages = 0, {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        cumulative, name = int(m.group(2)), m.group(4)
+        packages[name] = cumulative
+        if len(m.group(3)) == 1:  # import cấp cao nhất (không thụt lề)
+            total += cumulative
+    return total, packages
+
+
+def _first_render(runs: int) -> float:
+    """Trung vị (giây) từ lúc mở tiến trình tới khi quanlyvanban.py vẽ xong lần đầu."""
+    code = (
+        "import time; t0 = time.perf_counter()\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        f"at = AppTest.from_file({os.path.join(HERE, 'quanlyvanban.py')!r}, default_timeout=120).run()\n"
+        "assert not at.exception, [e.value for e in at.exception]\n"
+        "print(time.perf_counter() - t0)\n"
+    )
+    times = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                PYTHONPATH=HERE,
+                STORAGE_BACKEND="local",
+                VANBAN_DB=os.path.join(tmp, "vanban.db"),
+                LOCAL_STORAGE_DIR=os.path.join(tmp, "storage"),
+                BLOB_CACHE_DIR=os.path.join(tmp, "cache"),
+            )
+            proc = subprocess.run(
+                [sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+            times.append(float(proc.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=8, help="số package chậm nhất cần liệt kê")
+    ap.add_argument("--render", action="store_true", help="đo thêm thời gian vẽ trang đầu (AppTest)")
+    ap.add_argument("--json", help="ghi kết quả ra file JSON")
+    args = ap.parse_args()
+
+    report = {}
+    for app in APPS:
+        modules = _top_level_imports(os.path.join(HERE, app))
+        runs = [_importtime(modules) for _ in range(args.runs)]
+        total = statistics.median(t for t, _ in runs)
+        packages = runs[-1][1]
+        heavy = sorted(h for h in HEAVY if h in packages)
+        top_level = {m.split(".")[0] for m in modules}
+        slowest = sorted(
+            ((n, us) for n, us in packages.items() if n in top_level or n in modules),
+            key=lambda x: -x[1],
+        )[: args.top]
+
+        print(f"\n{app}: import lúc khởi động {total / 1000:.1f} ms (trung vị {args.runs} lần)")
+        for name, us in slowest:
+            print(f"  {us / 1000:8.1f} ms  {name}")
+        print("  SDK nặng bị import sớm:", ", ".join(heavy) if heavy else "không")
+        report[app] = {"import_ms": total / 1000, "slowest": dict(slowest), "heavy": heavy}
+
+    if args.render:
+        secs = _first_render(args.runs)
+        print(f"\nquanlyvanban.py: vẽ trang đầu sau {secs * 1000:.0f} ms (trung vị {args.runs} lần)")
+        report["first_render_ms"] = secs * 1000
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
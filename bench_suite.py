@@ -0,0 +1,302 @@
+# bench_suite.py
+"""
+Bộ đo hiệu năng chạy offline (không gọi Dropbox / Google): dữ liệu văn bản
+tiếng Việt tổng hợp, lưu file qua fakes.MemoryStorage, Drive/Sheets qua
+fakes.FakeGoogle, có thể tiêm độ trễ / lỗi.
+
+Kịch bản cho mỗi cỡ dữ liệu (mặc định 1k / 10k / 100k văn bản):
+- save:    nhập lô (bulk_ingest.ingest) + lưu từng văn bản (Storage.store + insert)
+- list:    trang đầu, facets (cơ quan, lĩnh vực, khoảng ngày)
+- filter:  lọc cơ quan + khoảng ngày; search: từ khóa không dấu 1 / nhiều từ
+- delete:  xóa mềm + compact (xóa file giả)
+- export:  CSV / XLSX / Parquet toàn bộ kết quả
+- sheets:  đọc Sheet (toàn bộ, không đổi, thêm dòng) + lưu văn bản vào Drive/Sheet
+
+Kết quả ghi ra JSON (--out); --baseline so với lần chạy trước, báo chậm hơn
+--threshold lần là hồi quy (mã thoát 1).
+
+Chạy:  python bench_suite.py --sizes 1000 10000 100000 --out bench.json
+       python bench_suite.py --sizes 1000 --latency 0.02 --error-rate 0.05 --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import itertools
+import platform
+import tempfile
+import statistics
+from datetime import date, datetime, timedelta
+
+import blob_cache
+import database
+import bulk_ingest
+import export_engine
+from drive_sheets import SheetCache, read_sheet_values, save_documents
+from fakes import FakeGoogle, FaultInjector, MemoryStorage
+
+CO_QUAN = ["UBND Tỉnh", "Sở Tài chính", "Sở Nội vụ", "Sở Y tế", "Sở Giáo dục và Đào tạo",
+           "Sở Tài nguyên và Môi trường", "UBND Huyện Đức Phổ", "Văn phòng Chính phủ"]
+LINH_VUC = ["Đất đai", "Tài chính", "Y tế", "Giáo dục", "Tổ chức cán bộ", "Xây dựng", "Môi trường"]
+LOAI = [("QĐ", "Quyết định"), ("CV", "Công văn"), ("TB", "Thông báo"), ("KH", "Kế hoạch"), ("BC", "Báo cáo")]
+CHU_DE = ["phê duyệt quy hoạch sử dụng đất", "giao dự toán ngân sách", "bổ nhiệm cán bộ",
+          "phòng chống dịch bệnh", "tuyển sinh năm học mới", "cấp giấy phép xây dựng",
+          "bảo vệ môi trường khu công nghiệp", "điều chỉnh giá đất", "kiện toàn tổ chức bộ máy"]
+
+SAVE_DOCS = 50          # số văn bản cho kịch bản save / delete / sheets.save
+DOC_BYTES = 64 * 1024   # kích thước file giả
+
+
+def make_records(n: int, seed: int = 1) -> list[dict]:
+    """n văn bản tổng hợp (số, tiêu đề, cơ quan, lĩnh vực, ngày, file)."""
+    rnd = random.Random(seed)
+    start = date(2015, 1, 1)
+    out = []
+    for i in range(n):
+        ky_hieu, loai = rnd.choice(LOAI)
+        co_quan = rnd.choice(CO_QUAN)
+        out.append({
+            "so_van_ban": f"{i + 1}/{ky_hieu}-{rnd.randint(1, 99)}",
+            "tieu_de": f"{loai} về việc {rnd.choice(CHU_DE)} {rnd.choice(LINH_VUC).lower()}",
+            "co_quan": co_quan,
+            "linh_vuc": rnd.choice(LINH_VUC),
+            "ngay_ban_hanh": (start + timedelta(days=rnd.randrange(3650))).isoformat(),
+            "file_dinh_kem": f"/van_ban/{i + 1}_{ky_hieu}.{rnd.choice(['pdf', 'docx'])}",
+        })
+    return out
+
+
+def _measure(fn, repeat: int) -> dict:
+    """
+    Chạy fn repeat lần: thời gian (ms) min / trung vị / p95 + kết quả lần cuối.
+    Lỗi (ví dụ lỗi tiêm bởi FaultInjector) không dừng bộ đo, chỉ được đếm.
+    """
+    times, result, errors = [], None, 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            errors += 1
+        times.append((time.perf_counter() - t) * 1000)
+    times.sort()
+    return {
+        "min_ms": round(times[0], 3),
+        "median_ms": round(statistics.median(times), 3),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 3),
+        "runs": repeat,
+        "errors": errors,
+        "result": result if isinstance(result, (int, float, str)) or result is None else None,
+    }
+
+
+def _retry(fn, tries: int = 10):
+    """Bước chuẩn bị (không đo): thử lại khi gặp lỗi tiêm."""
+    for attempt in range(tries):
+        try:
+            return fn()
+        except Exception:
+            if attempt == tries - 1:
+                raise
+
+
+def _bench_registry(size: int, tmp: str, repeat: int, faults: FaultInjector) -> dict:
+    db = os.path.join(tmp, f"bench_{size}.db")
+    store = MemoryStorage(faults)
+    res = {}
+
+    database.init_db(db)
+    records = make_records(size)
+    res["seed.insert_many"] = _measure(lambda: database.insert_many(records, db_path=db), 1)
+
+    # --- save ---
+    # Qua Storage.store như app (tính content_hash + tra trùng); mỗi file 1 nội
+    # dung khác nhau để đo đường upload thật, không phải đường dùng lại file
+    payload = os.urandom(DOC_BYTES)
+    unique = itertools.count()
+
+    def _doc() -> bytes:
+        return next(unique).to_bytes(8, "big") + payload[8:]
+
+    def _store(source, file_name):
+        return store.store(source, file_name, db_path=db)
+
+    items = [
+        bulk_ingest.IngestItem(name=f"lo_{k}.pdf", open=_doc, meta={"tieu_de": f"Văn bản lô {k}"})
+        for k in range(SAVE_DOCS)
+    ]
+    res["save.bulk_ingest"] = _measure(
+        lambda: bulk_ingest.ingest(items, _store, defaults={"co_quan": "UBND Tỉnh"}, db_path=db)[0], 1
+    )
+
+    def _save_one():
+        path, digest, _ = _store(_doc(), "mot_van_ban.pdf")
+        return database.insert_vanban(
+            {"so_van_ban": "1/QĐ", "tieu_de": "Quyết định lẻ", "file_dinh_kem": path, "content_hash": digest},
+            db_path=db,
+        )
+
+    res["save.single"] = _measure(_save_one, max(repeat, 10))
+
+    # --- list / filter / search ---
+    res["list.first_page"] = _measure(
+        lambda: len(database.query_vanban(database.VanbanFilter(), 0, 20, db_path=db)[0]), repeat
+    )
+    res["list.facets"] = _measure(
+        lambda: (database.distinct_values("co_quan", db_path=db),
+                 database.distinct_values("linh_vuc", db_path=db),
+                 database.date_bounds(db_path=db)) and None,
+        repeat,
+    )
+    flt_filter = database.VanbanFilter(
+        co_quan=["Sở Tài chính", "Sở Y tế"], date_from=date(2018, 1, 1), date_to=date(2020, 12, 31)
+    )
+    res["filter.coquan_date"] = _measure(lambda: database.query_vanban(flt_filter, 0, 20, db_path=db)[1], repeat)
+    for name, kw in (("search.one_term", "dat"), ("search.multi_term", "quyet dinh quy hoach dat"),
+                     ("search.accented", "Quyết định đất đai")):
+        flt = database.VanbanFilter(keyword=kw)
+        res[name] = _measure(lambda flt=flt: database.query_vanban(flt, 0, 20, db_path=db)[1], repeat)
+
+    # --- delete ---
+    with database.get_conn(db) as conn:
+        ids = [r[0] for r in conn.execute(
+            "SELECT id FROM vanban WHERE deleted_at IS NULL ORDER BY id DESC LIMIT ?", (SAVE_DOCS,)
+        )]
+    res["delete.soft"] = _measure(lambda: sum(database.delete_vanban(i, db_path=db) for i in ids), 1)
+
+    def _compact_all():
+        total = 0
+        while True:
+            n = database.compact(lambda p: store.delete(p, missing_ok=True), db_path=db)
+            if not n:
+                return total
+            total += n
+
+    res["delete.compact"] = _measure(_compact_all, 1)
+
+    # --- export ---
+    formats = ["csv", "xlsx"]
+    try:
+        import pyarrow  # noqa: F401
+        formats.append("parquet")
+    except ImportError:
+        pass
+    for fmt in formats:
+        def _export(fmt=fmt):
+            path, _, _ = export_engine.export_filtered(database.VanbanFilter(), fmt, db_path=db)
+            size_bytes = os.path.getsize(path)
+            os.remove(path)
+            return size_bytes
+        res[f"export.{fmt}"] = _measure(_export, 1 if size >= 100_000 else repeat)
+    return res
+
+
+def _bench_sheets(size: int, repeat: int, faults: FaultInjector) -> dict:
+    google = FakeGoogle(faults)
+    header = ["Số văn bản", "Tên văn bản", "Ngày ban hành", "Cơ quan ban hành", "Link", "FileID"]
+    google.rows = [header] + [
+        [r["so_van_ban"], r["tieu_de"], datetime.fromisoformat(r["ngay_ban_hanh"]).strftime("%d/%m/%Y"),
+         r["co_quan"], f"https://drive.google.com/file/d/f{i}/view", f"f{i}"]
+        for i, r in enumerate(make_records(size, seed=2))
+    ]
+    res = {}
+    res["sheets.read_full"] = _measure(
+        lambda: len(read_sheet_values(google.sheets, google.drive, google.sheet_id, SheetCache())[1]), repeat
+    )
+    cache = SheetCache()
+    _retry(lambda: read_sheet_values(google.sheets, google.drive, google.sheet_id, cache))
+    res["sheets.read_unchanged"] = _measure(
+        lambda: len(read_sheet_values(google.sheets, google.drive, google.sheet_id, cache)[1]), repeat
+    )
+
+    payload = os.urandom(DOC_BYTES)
+    docs = [
+        {"source": payload, "name": f"vb_{k}.pdf", "mimetype": "application/pdf",
+         "row": [f"{k}/QĐ", f"Văn bản {k}", "01/01/2024", "UBND Tỉnh"]}
+        for k in range(SAVE_DOCS)
+    ]
+    res["sheets.save_documents"] = _measure(
+        lambda: save_documents(google.drive, google.sheets, "folder", google.sheet_id, docs)[0], 1
+    )
+    res["sheets.read_appended"] = _measure(
+        lambda: len(read_sheet_values(google.sheets, google.drive, google.sheet_id, cache)[1]), 1
+    )
+    return res
+
+
+def _compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Các phép đo chậm hơn baseline quá threshold lần (so theo trung vị)."""
+    slower = []
+    for size, ops in report["results"].items():
+        for op, m in ops.items():
+            old = baseline.get("results", {}).get(size, {}).get(op)
+            # Bỏ qua phép đo quá nhanh (nhiễu đo lớn hơn chênh lệch)
+            if not old or old["median_ms"] < 1:
+                continue
+            ratio = m["median_ms"] / old["median_ms"]
+            if ratio > threshold:
+                slower.append(f"{size} {op}: {old['median_ms']:.1f} -> {m['median_ms']:.1f} ms (x{ratio:.2f})")
+    return slower
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repeat", type=int, default=5, help="số lần lặp mỗi phép đo")
+    ap.add_argument("--latency", type=float, default=0.0, help="độ trễ giả mỗi lệnh gọi API (giây)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="độ trễ ngẫu nhiên thêm (giây)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="xác suất lỗi giả mỗi lệnh gọi API")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="bench_report.json", help="file JSON kết quả")
+    ap.add_argument("--baseline", help="file JSON lần chạy trước để so sánh")
+    ap.add_argument("--threshold", type=float, default=1.3, help="chậm hơn bao nhiêu lần thì coi là hồi quy")
+    args = ap.parse_args()
+
+    report = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": {},
+        "api_calls": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        # blob_cache đã đọc BLOB_CACHE_DIR lúc import -> đặt thẳng CACHE_DIR
+        if not os.environ.get("BLOB_CACHE_DIR"):
+            blob_cache.CACHE_DIR = os.path.join(tmp, "cache")
+        for size in args.sizes:
+            faults = FaultInjector(args.latency, args.jitter, args.error_rate, seed=args.seed)
+            t = time.perf_counter()
+            res = _bench_registry(size, tmp, args.repeat, faults)
+            res.update(_bench_sheets(size, args.repeat, faults))
+            report["results"][str(size)] = res
+            report["api_calls"][str(size)] = faults.calls
+            print(f"\n== {size} văn bản ({time.perf_counter() - t:.1f} s) ==")
+            for op, m in res.items():
+                err = f"  {m['errors']} lỗi" if m["errors"] else ""
+                print(f"  {op:24s} {m['median_ms']:10.2f} ms  (p95 {m['p95_ms']:.2f}){err}")
+            print(f"  lệnh gọi API giả: {faults.calls}")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã ghi {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            slower = _compare(report, json.load(f), args.threshold)
+        for s in slower:
+            print("❌ Chậm hơn:", s)
+        if slower:
+            return 1
+        print("✅ Không có hồi quy so với", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
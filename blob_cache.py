@@ -0,0 +1,120 @@
+# blob_cache.py
+import os
+import mmap
+import tempfile
+import threading
+
+# Cache file đính kèm trên đĩa, khóa theo content_hash của Dropbox
+# (cùng nội dung -> cùng khóa, file đổi nội dung -> khóa mới).
+CACHE_DIR = os.environ.get("BLOB_CACHE_DIR", ".blob_cache")
+# Dung lượng tối đa; vượt quá thì xóa file ít dùng nhất (LRU theo mtime)
+MAX_BYTES = int(os.environ.get("BLOB_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+# Số file / dung lượng cache: quét thư mục 1 lần rồi cộng dồn trong bộ nhớ
+# (stats() chạy mỗi lượt rerun); evict() quét lại và đồng bộ khi phải xóa.
+# "dir" khác CACHE_DIR (chưa quét / đổi thư mục) -> quét lại.
+_totals = {"dir": None, "files": 0, "bytes": 0}
+
+
+def _blob_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], key)
+
+
+def get(key: str) -> str | None:
+    """Đường dẫn file cache nếu có (và đánh dấu vừa dùng), None nếu chưa có."""
+    path = _blob_path(key)
+    try:
+        os.utime(path)  # mtime = lần dùng gần nhất (LRU)
+    except FileNotFoundError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    with _lock:
+        _stats["hits"] += 1
+    return path
+
+
+def temp_path() -> str:
+    """File tạm trong thư mục cache (cùng ổ đĩa -> os.replace nguyên tử)."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".part")
+    os.close(fd)
+    return path
+
+
+def put_file(key: str, src_path: str) -> str:
+    """Đưa file đã tải xong (từ temp_path) vào cache, trả về đường dẫn trong cache."""
+    path = _blob_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    size = os.path.getsize(src_path)
+    with _lock:
+        _load_totals()
+        try:
+            old = os.path.getsize(path)
+        except FileNotFoundError:
+            old = None
+        os.replace(src_path, path)
+        _totals["files"] += old is None
+        _totals["bytes"] += size - (old or 0)
+        over = _totals["bytes"] > MAX_BYTES
+    if over:
+        evict()
+    return path
+
+
+def read_bytes(path: str) -> bytes:
+    """Đọc file cache qua mmap (không qua buffer đọc của Python)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:]
+
+
+def _entries() -> list[os.DirEntry]:
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    out = []
+    for sub in os.scandir(CACHE_DIR):
+        if sub.is_dir():
+            out.extend(e for e in os.scandir(sub.path) if e.is_file())
+    return out
+
+
+def _load_totals() -> None:
+    """Quét thư mục cache lần đầu (gọi khi đang giữ _lock)."""
+    if _totals["dir"] != CACHE_DIR:
+        entries = _entries()
+        _totals.update(dir=CACHE_DIR, files=len(entries), bytes=sum(e.stat().st_size for e in entries))
+
+
+def evict(max_bytes: int | None = None) -> int:
+    """Xóa file cũ nhất tới khi tổng dung lượng <= max_bytes. Trả về số file đã xóa."""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in _entries()]
+    total = sum(size for _, size, _ in entries)
+    files = len(entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        removed += 1
+    with _lock:
+        _stats["evictions"] += removed
+        # Đồng bộ lại với đĩa (file do tiến trình khác ghi / xóa)
+        _totals.update(dir=CACHE_DIR, files=files - removed, bytes=total)
+    return removed
+
+
+def stats() -> dict:
+    """Bộ đếm hit/miss/evictions (trong tiến trình) + số file, dung lượng cache."""
+    with _lock:
+        _load_totals()
+        return {**_stats, "files": _totals["files"], "bytes": _totals["bytes"]}
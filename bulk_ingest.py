@@ -0,0 +1,143 @@
+# bulk_ingest.py
+import os
+import time
+import zipfile
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import Callable
+
+import database
+
+# Số file upload song song (giới hạn để không vượt rate limit của Dropbox)
+MAX_WORKERS = int(os.environ.get("INGEST_WORKERS", "4"))
+# Số lần thử lại mỗi file khi upload lỗi
+RETRIES = 2
+
+ALLOWED_EXTS = (".pdf", ".docx")
+
+# Cột bảng metadata (xlsx/csv) -> cột SQLite; "Tên file" dùng để ghép với file đính kèm
+METADATA_COLUMNS = {
+    "Số văn bản": "so_van_ban",
+    "Tiêu đề": "tieu_de",
+    "Cơ quan": "co_quan",
+    "Lĩnh vực": "linh_vuc",
+    "Ngày ban hành": "ngay_ban_hanh",
+}
+
+
+@dataclass
+class IngestItem:
+    """1 file cần nhập: tên file + hàm mở nội dung (gọi trong thread upload)."""
+    name: str
+    open: Callable[[], object]
+    meta: dict = field(default_factory=dict)
+
+
+def _to_iso(val) -> str:
+    """date/datetime/"YYYY-MM-DD"/"dd/mm/yyyy" -> "YYYY-MM-DD" ("" nếu không đọc được)."""
+    if isinstance(val, datetime):
+        return val.date().isoformat()
+    if isinstance(val, date):
+        return val.isoformat()
+    val = str(val or "").strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(val, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return ""
+
+
+def metadata_by_file(records: list[dict]) -> dict[str, dict]:
+    """Các dòng bảng metadata -> {tên file (chữ thường): dòng SQLite}."""
+    out = {}
+    for rec in records:
+        name = str(rec.get("Tên file") or "").strip()
+        if not name:
+            continue
+        row = {col: str(rec.get(src) or "").strip() for src, col in METADATA_COLUMNS.items()}
+        row["ngay_ban_hanh"] = _to_iso(rec.get("Ngày ban hành"))
+        out[os.path.basename(name).lower()] = row
+    return out
+
+
+def items_from_uploads(files, metadata: dict[str, dict]) -> list[IngestItem]:
+    """
+    UploadedFile (PDF/DOCX hoặc ZIP chứa PDF/DOCX) -> danh sách IngestItem.
+    File trong ZIP chỉ được giải nén lúc upload (từng file, trong thread).
+    """
+    items = []
+    for f in files:
+        if f.name.lower().endswith(".zip"):
+            zf = zipfile.ZipFile(f)
+            for info in zf.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name.lower().endswith(ALLOWED_EXTS):
+                    continue
+                items.append(IngestItem(
+                    name=name,
+                    open=lambda zf=zf, info=info: zf.read(info),
+                    meta=metadata.get(name.lower(), {}),
+                ))
+        elif f.name.lower().endswith(ALLOWED_EXTS):
+            items.append(IngestItem(
+                name=f.name,
+                open=lambda f=f: f,
+                meta=metadata.get(f.name.lower(), {}),
+            ))
+    return items
+
+
+def _upload_with_retry(item: IngestItem, upload_fn: Callable, retries: int):
+    for attempt in range(retries + 1):
+        try:
+            return upload_fn(item.open(), item.name)
+        except Exception:
+            if attempt >= retries:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def ingest(
+    items: list[IngestItem],
+    upload_fn: Callable,
+    defaults: dict | None = None,
+    on_progress: Callable[[int, int, str, Exception | None], None] | None = None,
+    max_workers: int = MAX_WORKERS,
+    retries: int = RETRIES,
+    db_path: str | None = None,
+) -> tuple[int, dict[str, Exception]]:
+    """
+    Upload song song (ThreadPoolExecutor giới hạn max_workers), thử lại từng file,
+    rồi ghi tất cả dòng vào CSDL trong 1 transaction.
+    - upload_fn(source, file_name) -> đường dẫn Dropbox, hoặc (đường dẫn, content_hash, ...)
+      như storage.Storage.store (khử trùng lặp, lưu kèm content_hash)
+    - defaults: giá trị mặc định cho cột không có trong bảng metadata
+    - on_progress(đã xong, tổng, tên file, lỗi|None): gọi trên thread hiện tại
+    Trả về (số dòng đã lưu, {tên file: lỗi}).
+    """
+    defaults = defaults or {}
+    rows, errors = [], {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_upload_with_retry, it, upload_fn, retries): it for it in items}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            item = futures[fut]
+            err = fut.exception()
+            if err is None:
+                row = {**defaults, **{k: v for k, v in item.meta.items() if v}}
+                row.setdefault("tieu_de", os.path.splitext(item.name)[0])
+                result = fut.result()
+                if isinstance(result, tuple):
+                    row["file_dinh_kem"], row["content_hash"] = result[:2]
+                else:
+                    row["file_dinh_kem"] = result
+                rows.append(row)
+            else:
+                errors[item.name] = err
+            if on_progress:
+                on_progress(done, len(items), item.name, err)
+
+    if rows:
+        database.insert_many(rows, db_path=db_path)
+    return len(rows), errors
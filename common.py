@@ -0,0 +1,26 @@
+# common.py
+"""
+Tiện ích dùng chung của các module:
+- setting: đọc cấu hình (biến môi trường -> st.secrets -> mặc định)
+- unique_name: đặt tên file không trùng kiểu autorename của Dropbox
+"""
+import os
+
+
+def setting(key: str, default=None):
+    """Đọc cấu hình: biến môi trường -> secrets -> giá trị mặc định."""
+    val = os.environ.get(key)
+    if val:
+        return val
+    try:
+        import streamlit as st
+        return st.secrets.get(key, default)
+    except Exception:
+        # Chạy ngoài Streamlit / không có secrets.toml
+        return default
+
+
+def unique_name(file_name: str, n: int) -> str:
+    """Tên thứ n khi trùng tên (giống Dropbox autorename): "a.pdf" -> "a (1).pdf"."""
+    stem, ext = os.path.splitext(file_name)
+    return f"{stem} ({n}){ext}" if n else file_name
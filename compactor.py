@@ -0,0 +1,37 @@
+# compactor.py
+import os
+import threading
+import traceback
+
+import database
+
+# Chu kỳ dọn định kỳ (giây); sau mỗi lần xóa trên giao diện sẽ dọn ngay
+COMPACT_INTERVAL = int(os.environ.get("COMPACT_INTERVAL", "300"))
+
+
+class Compactor(threading.Thread):
+    """
+    Thread nền dọn các văn bản đã xóa mềm (database.compact):
+    xóa file Dropbox + xóa hẳn dòng, không chặn giao diện.
+    """
+
+    def __init__(self, delete_file, interval: int = COMPACT_INTERVAL, db_path: str | None = None):
+        super().__init__(name="vanban-compactor", daemon=True)
+        self._delete_file = delete_file
+        self._interval = interval
+        self._db_path = db_path
+        self._wake = threading.Event()
+
+    def wake(self) -> None:
+        """Yêu cầu dọn ngay (gọi sau khi xóa mềm)."""
+        self._wake.set()
+
+    def run(self) -> None:
+        while True:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                # compact() tự duyệt hết các lô
+                database.compact(self._delete_file, db_path=self._db_path)
+            except Exception:
+                traceback.print_exc()
@@ -1,17 +1,714 @@
+import os
+import csv
 import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Iterator
 
-def init_db():
-    conn = sqlite3.connect("vanban.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS vanban (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        so_van_ban TEXT,
-        tieu_de TEXT,
-        ngay_ban_hanh TEXT,
-        co_quan TEXT,
-        linh_vuc TEXT,
-        file_dinh_kem TEXT
-    )""")
-    conn.commit()
-    conn.close()
+import metrics
+from vn_text import fold, search_terms
+
+# File SQLite lưu sổ văn bản (có thể đổi qua biến môi trường)
+DB_FILE = os.environ.get("VANBAN_DB", "vanban.db")
+
+# Các cột nghiệp vụ của bảng vanban (theo đúng thứ tự khi insert)
+VANBAN_FIELDS = (
+    "so_van_ban",
+    "tieu_de",
+    "ngay_ban_hanh",   # ISO YYYY-MM-DD
+    "co_quan",
+    "linh_vuc",
+    "file_dinh_kem",   # đường dẫn Dropbox, NULL nếu không có file
+)
+
+# Cột dẫn xuất, tính 1 lần khi lưu (không tính lại mỗi lần hiển thị):
+# - norm_text: ghép các trường rồi bỏ dấu (tìm kiếm)
+# - ext: đuôi file đính kèm ("pdf", "docx", ...; lọc theo định dạng)
+# - file_key: đường dẫn file viết thường (khớp path_lower của Dropbox)
+DERIVED_FIELDS = ("norm_text", "ext", "file_key")
+
+# Cột bổ sung sau bảng gốc (thêm bằng ALTER TABLE nếu CSDL cũ chưa có)
+_EXTRA_COLUMNS = {
+    "norm_text": "TEXT",
+    "ext": "TEXT",
+    "file_key": "TEXT",
+    "deleted_at": "TEXT",         # xóa mềm (NULL = còn hiệu lực)
+    # Thông tin file trên Dropbox, cập nhật bởi dropbox_sync
+    "file_size": "INTEGER",
+    "file_rev": "TEXT",
+    "content_hash": "TEXT",
+    "file_missing": "INTEGER NOT NULL DEFAULT 0",  # 1 = file không còn trên Dropbox
+    # Nội dung file đính kèm (text_index): phiên bản file lúc trích (content_hash / rev),
+    # thời điểm trích, chữ đã bỏ dấu. content_text để cuối: các truy vấn đọc cột
+    # khác không phải đi qua phần dữ liệu lớn này.
+    "content_key": "TEXT",
+    "content_indexed_at": "TEXT",
+    "content_text": "TEXT",
+}
+# content_hash: biết ngay lúc upload (storage.Storage.store), không phải chờ đồng bộ
+_INSERT_COLUMNS = VANBAN_FIELDS + DERIVED_FIELDS + ("content_hash",)
+_INSERT_SQL = (
+    f"INSERT INTO vanban ({', '.join(_INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _INSERT_COLUMNS)})"
+)
+
+# Cột CSV cũ -> cột SQLite
+_CSV_COLUMNS = {
+    "Số văn bản": "so_van_ban",
+    "Tiêu đề": "tieu_de",
+    "NgayBH": "ngay_ban_hanh",
+    "Cơ quan": "co_quan",
+    "Lĩnh vực": "linh_vuc",
+    "File Dropbox": "file_dinh_kem",
+}
+
+
+# Các cột của chỉ mục FTS5 vanban_fts
+_FTS_COLUMNS = ("norm_text", "content_text")
+# Trọng số bm25: khớp ở số / tiêu đề / cơ quan xếp trên khớp trong nội dung file
+_FTS_WEIGHTS = (10.0, 1.0)
+
+# Thời gian chờ khóa ghi (giây) khi nhiều phiên/tiến trình cùng ghi
+BUSY_TIMEOUT = 30
+
+
+def _connect(db_path: str | None = None) -> sqlite3.Connection:
+    """Mở kết nối SQLite (WAL, trả về sqlite3.Row, tự quản lý transaction)."""
+    conn = sqlite3.connect(db_path or DB_FILE, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextmanager
+def get_conn(db_path: str | None = None, write: bool = False):
+    """
+    Kết nối dùng với `with`, mọi lệnh bên trong là 1 transaction:
+    commit khi thành công, rollback khi lỗi.
+    - write=True: BEGIN IMMEDIATE -> giữ khóa ghi ngay từ đầu, các phiên
+      Streamlit / tiến trình khác ghi cùng lúc sẽ xếp hàng (chờ tối đa
+      BUSY_TIMEOUT) thay vì đọc-rồi-ghi đè lên nhau.
+    - write=False: BEGIN (đọc trên 1 snapshot nhất quán, ví dụ COUNT + trang).
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def init_db(db_path: str | None = None) -> None:
+    """Tạo bảng + index + chỉ mục tìm kiếm nếu chưa có (an toàn khi gọi lặp lại)."""
+    with get_conn(db_path, write=True) as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS vanban (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            so_van_ban TEXT,
+            tieu_de TEXT,
+            ngay_ban_hanh TEXT,
+            co_quan TEXT,
+            linh_vuc TEXT,
+            file_dinh_kem TEXT
+        )""")
+        # Bổ sung cột mới rồi tính cột dẫn xuất cho các dòng có sẵn
+        cols = {r["name"] for r in conn.execute("PRAGMA table_info(vanban)")}
+        for col, decl in _EXTRA_COLUMNS.items():
+            if col not in cols:
+                conn.execute(f"ALTER TABLE vanban ADD COLUMN {col} {decl}")
+        _backfill_derived(conn)
+
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vanban_co_quan ON vanban(co_quan)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vanban_linh_vuc ON vanban(linh_vuc)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vanban_ngay_ban_hanh ON vanban(ngay_ban_hanh)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vanban_ext ON vanban(ext)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vanban_file ON vanban(file_dinh_kem)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vanban_file_key ON vanban(file_key)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vanban_content_hash ON vanban(content_hash)")
+        # Chỉ các dòng đã xóa mềm (cho compact())
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_vanban_deleted_at ON vanban(deleted_at) "
+            "WHERE deleted_at IS NOT NULL"
+        )
+        # compact() duyệt các dòng đã xóa theo id (keyset)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_vanban_tombstone_id ON vanban(id) "
+            "WHERE deleted_at IS NOT NULL"
+        )
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )""")
+        _init_version(conn)
+        _init_fts(conn)
+
+
+def _init_version(conn: sqlite3.Connection) -> None:
+    """
+    Bộ đếm phiên bản sổ văn bản: tăng mỗi khi bảng vanban thay đổi
+    (trigger, nên mọi đường ghi đều được tính). Dùng làm khóa cache ở giao diện.
+    """
+    conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('registry_version', '0')")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS vanban_version_{event.lower()} AFTER {event} ON vanban BEGIN
+            UPDATE app_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'registry_version';
+        END""")
+
+
+def _init_fts(conn: sqlite3.Connection) -> None:
+    """
+    Chỉ mục FTS5 (external content) trên norm_text + content_text, đồng bộ bằng trigger.
+    Bản SQLite không có FTS5 thì bỏ qua -> tìm kiếm dùng LIKE trên 2 cột này.
+    """
+    if _has_fts(conn):
+        cols = tuple(r["name"] for r in conn.execute("PRAGMA table_info(vanban_fts)"))
+        if cols == _FTS_COLUMNS:
+            return
+        # Chỉ mục cũ (chỉ có norm_text) -> tạo lại kèm cột nội dung file
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS vanban_fts_{suffix}")
+        conn.execute("DROP TABLE vanban_fts")
+    try:
+        conn.execute("""
+        CREATE VIRTUAL TABLE vanban_fts USING fts5(
+            norm_text,
+            content_text,
+            content='vanban',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""")
+    except sqlite3.OperationalError:
+        return
+    # Từng lệnh riêng (không dùng executescript: nó tự COMMIT giữa transaction)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS vanban_fts_ai AFTER INSERT ON vanban BEGIN
+        INSERT INTO vanban_fts(rowid, norm_text, content_text) VALUES (new.id, new.norm_text, new.content_text);
+    END""")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS vanban_fts_ad AFTER DELETE ON vanban BEGIN
+        INSERT INTO vanban_fts(vanban_fts, rowid, norm_text, content_text)
+        VALUES ('delete', old.id, old.norm_text, old.content_text);
+    END""")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS vanban_fts_au AFTER UPDATE OF norm_text, content_text ON vanban BEGIN
+        INSERT INTO vanban_fts(vanban_fts, rowid, norm_text, content_text)
+        VALUES ('delete', old.id, old.norm_text, old.content_text);
+        INSERT INTO vanban_fts(rowid, norm_text, content_text) VALUES (new.id, new.norm_text, new.content_text);
+    END""")
+    # Dữ liệu có sẵn trước khi tạo chỉ mục
+    conn.execute("INSERT INTO vanban_fts(vanban_fts) VALUES ('rebuild')")
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vanban_fts'"
+    ).fetchone() is not None
+
+
+def _backfill_derived(conn: sqlite3.Connection) -> None:
+    rows = conn.execute(
+        f"SELECT id, {', '.join(VANBAN_FIELDS)} FROM vanban "
+        f"WHERE {' OR '.join(f'{c} IS NULL' for c in DERIVED_FIELDS)}"
+    ).fetchall()
+    conn.executemany(
+        f"UPDATE vanban SET {', '.join(f'{c} = ?' for c in DERIVED_FIELDS)} WHERE id = ?",
+        [_derived_values(dict(r)) + (r["id"],) for r in rows],
+    )
+
+
+# =========================
+# Ghi
+# =========================
+def _norm_text(row: dict) -> str:
+    """Chuỗi tìm kiếm không dấu của 1 văn bản (số, tiêu đề, cơ quan, lĩnh vực, file, ngày)."""
+    return fold(" ".join(str(row.get(k) or "") for k in (
+        "so_van_ban", "tieu_de", "co_quan", "linh_vuc", "file_dinh_kem", "ngay_ban_hanh",
+    )))
+
+
+def _derived_values(row: dict) -> tuple:
+    path = row.get("file_dinh_kem") or ""
+    if not path.startswith("/"):
+        return _norm_text(row), "", ""
+    return _norm_text(row), os.path.splitext(path)[1].lstrip(".").lower(), path.lower()
+
+
+def _row_values(row: dict) -> tuple:
+    return (
+        tuple((row.get(k) or None) for k in VANBAN_FIELDS)
+        + _derived_values(row)
+        + (row.get("content_hash") or None,)
+    )
+
+
+def insert_vanban(row: dict, db_path: str | None = None) -> int:
+    """Thêm 1 văn bản, trả về id mới."""
+    with get_conn(db_path, write=True) as conn:
+        cur = conn.execute(_INSERT_SQL, _row_values(row))
+        return cur.lastrowid
+
+
+@metrics.timed("db.insert_many")
+def insert_many(rows: list[dict], db_path: str | None = None) -> int:
+    """Thêm nhiều văn bản trong 1 transaction, trả về số dòng đã thêm."""
+    with get_conn(db_path, write=True) as conn:
+        conn.executemany(_INSERT_SQL, [_row_values(r) for r in rows])
+    return len(rows)
+
+
+def delete_vanban(vanban_id: int, db_path: str | None = None) -> bool:
+    """
+    Xóa mềm 1 văn bản theo id (đặt deleted_at), chi phí không phụ thuộc số văn bản.
+    Dòng + file Dropbox được dọn thật sau đó bởi compact().
+    Trả về False nếu id không tồn tại / đã xóa.
+    """
+    with get_conn(db_path, write=True) as conn:
+        cur = conn.execute(
+            "UPDATE vanban SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL",
+            (datetime.now().isoformat(timespec="seconds"), vanban_id),
+        )
+        return cur.rowcount > 0
+
+
+def compact(
+    delete_file=None,
+    batch_size: int = 500,
+    db_path: str | None = None,
+) -> int:
+    """
+    Dọn các văn bản đã xóa mềm: xóa file đính kèm (nếu không còn văn bản nào
+    khác dùng chung file) bằng delete_file(path), rồi xóa hẳn dòng khỏi CSDL.
+    Duyệt hết các dòng đã xóa theo lô batch_size (theo id tăng dần), nên file
+    xóa lỗi mãi không chặn các dòng sau; dòng đó được giữ lại để lần sau thử lại.
+    Trả về số dòng đã dọn.
+    """
+    total, last_id = 0, 0
+    while True:
+        purged, last_id = _compact_batch(delete_file, last_id, batch_size, db_path)
+        if last_id is None:
+            return total
+        total += purged
+
+
+def _compact_batch(delete_file, after_id: int, batch_size: int, db_path: str | None) -> tuple[int, int | None]:
+    """1 lô dòng đã xóa có id > after_id. Trả về (số dòng đã dọn, id cuối của lô | None nếu hết)."""
+    with get_conn(db_path, write=True) as conn:
+        tombstones = conn.execute(
+            "SELECT id, file_dinh_kem FROM vanban WHERE deleted_at IS NOT NULL AND id > ? "
+            "ORDER BY id LIMIT ?",
+            (after_id, batch_size),
+        ).fetchall()
+        if not tombstones:
+            return 0, None
+        # Kiểm tra "còn dùng" trong transaction ghi: văn bản dùng chung file (storage.store)
+        # thêm trước thời điểm này được thấy; dòng không có file / file còn dùng -> xóa dòng ngay
+        purge, orphan = [], []
+        for row in tombstones:
+            path = row["file_dinh_kem"]
+            if path and delete_file is not None and not _path_in_use(conn, path):
+                orphan.append(row)
+            else:
+                purge.append((row["id"],))
+        conn.executemany("DELETE FROM vanban WHERE id = ? AND deleted_at IS NOT NULL", purge)
+
+    # Xóa file ngoài transaction (gọi mạng)
+    deleted = []
+    for row in orphan:
+        try:
+            delete_file(row["file_dinh_kem"])
+        except Exception:
+            continue
+        deleted.append(row)
+
+    if deleted:
+        with get_conn(db_path, write=True) as conn:
+            conn.executemany(
+                "DELETE FROM vanban WHERE id = ? AND deleted_at IS NOT NULL",
+                [(row["id"],) for row in deleted],
+            )
+            # Văn bản vừa được thêm cùng file trong lúc xóa -> đánh dấu thiếu file
+            # (không để dòng trỏ tới file không còn mà không báo)
+            conn.executemany(
+                "UPDATE vanban SET file_missing = 1 WHERE file_dinh_kem = ? AND deleted_at IS NULL",
+                [(row["file_dinh_kem"],) for row in deleted],
+            )
+    return len(purge) + len(deleted), tombstones[-1]["id"]
+
+
+def find_file_by_hash(content_hash: str, db_path: str | None = None) -> str | None:
+    """Đường dẫn file đính kèm (còn trên kho lưu trữ) có cùng content_hash, None nếu chưa có."""
+    with get_conn(db_path) as conn:
+        row = conn.execute(
+            "SELECT file_dinh_kem FROM vanban "
+            "WHERE content_hash = ? AND deleted_at IS NULL AND file_missing = 0 "
+            "AND COALESCE(file_dinh_kem, '') <> '' ORDER BY id LIMIT 1",
+            (content_hash,),
+        ).fetchone()
+        return row[0] if row else None
+
+
+def _path_in_use(conn: sqlite3.Connection, path: str) -> bool:
+    """Còn văn bản (chưa xóa) nào trỏ tới file này không."""
+    return conn.execute(
+        "SELECT 1 FROM vanban WHERE file_dinh_kem = ? AND deleted_at IS NULL LIMIT 1",
+        (path,),
+    ).fetchone() is not None
+
+
+# =========================
+# Đọc
+# =========================
+@dataclass
+class VanbanFilter:
+    """Bộ lọc danh sách (tương ứng khung "Tìm kiếm & bộ lọc")."""
+    keyword: str = ""
+    co_quan: list[str] = field(default_factory=list)
+    linh_vuc: list[str] = field(default_factory=list)
+    extensions: list[str] = field(default_factory=list)  # ["pdf", "docx"]
+    date_from: date | None = None
+    date_to: date | None = None
+
+
+def _filter_sql(conn: sqlite3.Connection, flt: VanbanFilter) -> tuple[str, str, list]:
+    """Sinh (FROM ... WHERE ..., ORDER BY ..., params) cho 1 bộ lọc."""
+    source = "FROM vanban"
+    where, params = ["vanban.deleted_at IS NULL"], []
+    order = "vanban.id"
+
+    terms = search_terms(flt.keyword)
+    if terms:
+        if _has_fts(conn):
+            source = "FROM vanban JOIN vanban_fts ON vanban_fts.rowid = vanban.id"
+            where.append("vanban_fts MATCH ?")
+            params.append(_fts_query(terms))
+            order = f"bm25(vanban_fts, {', '.join(map(str, _FTS_WEIGHTS))}), vanban.id"
+        else:
+            for t in terms:
+                where.append("(vanban.norm_text LIKE ? OR vanban.content_text LIKE ?)")
+                params.extend([f"%{t}%"] * 2)
+    for column, values in (("co_quan", flt.co_quan), ("linh_vuc", flt.linh_vuc)):
+        if values:
+            where.append(f"vanban.{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+    if flt.extensions:
+        where.append(f"vanban.ext IN ({', '.join('?' for _ in flt.extensions)})")
+        params.extend(ext.lower().lstrip(".") for ext in flt.extensions)
+    if flt.date_from:
+        where.append("vanban.ngay_ban_hanh >= ?")
+        params.append(flt.date_from.isoformat())
+    if flt.date_to:
+        where.append("vanban.ngay_ban_hanh <= ?")
+        params.append(flt.date_to.isoformat())
+
+    source += " WHERE " + " AND ".join(where)
+    return source, order, params
+
+
+def _fts_query(terms: list[str]) -> str:
+    """["01/qd", "dat"] -> '"01/qd"* "dat"*' (mỗi từ là 1 cụm, khớp tiền tố)."""
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+
+@metrics.timed("db.query")
+def query_vanban(
+    flt: VanbanFilter,
+    offset: int = 0,
+    limit: int | None = None,
+    db_path: str | None = None,
+) -> tuple[list[sqlite3.Row], int]:
+    """
+    Lọc + phân trang ngay trong SQLite.
+    - Trả về (các dòng của trang [offset, offset + limit), tổng số dòng khớp bộ lọc).
+    - limit=None: lấy hết (dùng khi xuất file).
+    """
+    columns = ", ".join(f"vanban.{c}" for c in ("id",) + VANBAN_FIELDS + ("file_missing",))
+    with get_conn(db_path) as conn:
+        source, order, params = _filter_sql(conn, flt)
+        total = conn.execute(f"SELECT COUNT(*) {source}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {columns} {source} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        ).fetchall()
+        return rows, total
+
+
+def iter_vanban(
+    flt: VanbanFilter,
+    columns: tuple[str, ...] = VANBAN_FIELDS,
+    chunk_size: int = 1000,
+    db_path: str | None = None,
+) -> Iterator[list[sqlite3.Row]]:
+    """
+    Duyệt toàn bộ kết quả lọc theo từng lô chunk_size dòng (fetchmany),
+    cùng thứ tự với query_vanban, trong 1 transaction đọc (ảnh chụp nhất quán).
+    Dùng khi xuất file lớn: không nạp hết kết quả vào bộ nhớ.
+    """
+    select = ", ".join(f"vanban.{c}" for c in columns)
+    with get_conn(db_path) as conn:
+        source, order, params = _filter_sql(conn, flt)
+        cur = conn.execute(f"SELECT {select} {source} ORDER BY {order}", params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+
+def registry_version(db_path: str | None = None) -> int:
+    """Số phiên bản hiện tại của sổ văn bản (đổi sau mỗi lần thêm/sửa/xóa)."""
+    with get_conn(db_path) as conn:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = 'registry_version'").fetchone()
+        return int(row[0]) if row else 0
+
+
+def get_meta(key: str, db_path: str | None = None) -> str | None:
+    with get_conn(db_path) as conn:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+def set_meta(key: str, value: str | None, db_path: str | None = None) -> None:
+    with get_conn(db_path, write=True) as conn:
+        if value is None:
+            conn.execute("DELETE FROM app_meta WHERE key = ?", (key,))
+        else:
+            conn.execute(
+                "INSERT INTO app_meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+
+def has_vanban(db_path: str | None = None) -> bool:
+    with get_conn(db_path) as conn:
+        return conn.execute(
+            "SELECT 1 FROM vanban WHERE deleted_at IS NULL LIMIT 1"
+        ).fetchone() is not None
+
+
+def distinct_values(column: str, db_path: str | None = None) -> list[str]:
+    """Danh sách giá trị khác rỗng của 1 cột (dùng cho bộ lọc)."""
+    if column not in VANBAN_FIELDS:
+        raise ValueError(f"Cột không hợp lệ: {column}")
+    with get_conn(db_path) as conn:
+        cur = conn.execute(
+            f"SELECT DISTINCT {column} FROM vanban "
+            f"WHERE deleted_at IS NULL AND TRIM(COALESCE({column}, '')) <> '' ORDER BY {column}"
+        )
+        return [r[0] for r in cur]
+
+
+def date_bounds(db_path: str | None = None) -> tuple[str | None, str | None]:
+    """(min, max) của ngay_ban_hanh dạng ISO, None nếu chưa có dữ liệu."""
+    with get_conn(db_path) as conn:
+        row = conn.execute(
+            "SELECT MIN(ngay_ban_hanh), MAX(ngay_ban_hanh) FROM vanban "
+            "WHERE deleted_at IS NULL AND COALESCE(ngay_ban_hanh, '') <> ''"
+        ).fetchone()
+        return row[0], row[1]
+
+
+# =========================
+# Nội dung file đính kèm (text_index)
+# =========================
+# Phiên bản file hiện tại; content_key khác giá trị này -> file đã đổi, cần trích lại
+_FILE_VERSION = "COALESCE(content_hash, file_rev)"
+
+
+def pending_content(extensions: tuple[str, ...], limit: int = 100, db_path: str | None = None) -> list[sqlite3.Row]:
+    """
+    Các văn bản cần trích nội dung file: chưa trích lần nào, hoặc file đã đổi
+    (content_hash / rev khác lúc trích). Mỗi dòng: id, file_dinh_kem, ext, file_version.
+    Văn bản mới upload chưa có content_hash / rev (chưa đồng bộ) -> content_key NULL,
+    lần đồng bộ đầu gắn phiên bản file vào content_key mà không trích lại
+    (apply_file_changes).
+    """
+    with get_conn(db_path) as conn:
+        return conn.execute(
+            f"SELECT id, file_dinh_kem, ext, {_FILE_VERSION} AS file_version FROM vanban "
+            f"WHERE deleted_at IS NULL AND file_missing = 0 "
+            f"AND ext IN ({', '.join('?' for _ in extensions)}) "
+            f"AND (content_indexed_at IS NULL "
+            f"     OR (content_key IS NOT NULL AND content_key IS NOT {_FILE_VERSION})) "
+            f"ORDER BY id LIMIT ?",
+            list(extensions) + [limit],
+        ).fetchall()
+
+
+def set_content(results: list[tuple[int, str | None, str | None]], db_path: str | None = None) -> None:
+    """
+    Ghi nội dung đã trích: [(id, chữ đã bỏ dấu hoặc None nếu lỗi, file_version lúc trích)].
+    Chỉ mục FTS được cập nhật qua trigger.
+    """
+    now = datetime.now().isoformat(timespec="seconds")
+    with get_conn(db_path, write=True) as conn:
+        conn.executemany(
+            "UPDATE vanban SET content_text = ?, content_key = ?, content_indexed_at = ? WHERE id = ?",
+            [(text, key, now, vanban_id) for vanban_id, text, key in results],
+        )
+
+
+def reset_content(failed_only: bool = False, db_path: str | None = None) -> int:
+    """Đánh dấu cần trích lại (tất cả, hoặc chỉ các file trích lỗi). Trả về số dòng."""
+    cond = "content_indexed_at IS NOT NULL"
+    if failed_only:
+        cond += " AND content_text IS NULL"
+    with get_conn(db_path, write=True) as conn:
+        return conn.execute(f"UPDATE vanban SET content_indexed_at = NULL WHERE {cond}").rowcount
+
+
+def content_stats(db_path: str | None = None) -> dict:
+    """{"files": số văn bản có file, "indexed": đã trích được nội dung, "failed": trích lỗi}."""
+    with get_conn(db_path) as conn:
+        row = conn.execute(
+            "SELECT COUNT(*), "
+            "COALESCE(SUM(content_indexed_at IS NOT NULL AND content_text IS NOT NULL), 0), "
+            "COALESCE(SUM(content_indexed_at IS NOT NULL AND content_text IS NULL), 0) "
+            "FROM vanban WHERE deleted_at IS NULL AND file_missing = 0 AND COALESCE(file_key, '') <> ''"
+        ).fetchone()
+        return {"files": row[0], "indexed": row[1], "failed": row[2]}
+
+
+# =========================
+# Đối chiếu với thư mục Dropbox (dropbox_sync)
+# =========================
+def _prefix_range(folder_key: str) -> tuple[str, str]:
+    """Khoảng [lo, hi) của mọi đường dẫn nằm trong thư mục (dùng được index)."""
+    folder_key = folder_key.rstrip("/")
+    return folder_key + "/", folder_key + chr(ord("/") + 1)
+
+
+def apply_file_changes(
+    files: list[dict],
+    removed: list[str],
+    folder_key: str | None = None,
+    db_path: str | None = None,
+    unmatched: list[dict] | None = None,
+) -> dict:
+    """
+    Ghi kết quả list_folder của Dropbox vào sổ văn bản (1 transaction).
+    - files: [{"path_lower", "path_display", "size", "rev", "content_hash"}]
+    - removed: path_lower của các file đã bị xóa/đổi tên trên Dropbox
+    - folder_key: khi đồng bộ toàn bộ (không có cursor): mọi văn bản trong thư mục
+      này mà không có trong `files` bị đánh dấu thiếu file
+    - unmatched: nếu có, nhận các file không khớp văn bản nào (để dropbox_sync
+      đưa lại khi trang sau mới báo file cũ bị xóa)
+    File mới có content_hash trùng 1 văn bản đang thiếu file -> coi là đổi tên /
+    di chuyển, cập nhật lại đường dẫn của văn bản đó. Việc này làm sau khi đã
+    khớp mọi file theo đường dẫn, để 1 bản sao mới không "lấy" văn bản của file
+    vẫn còn nhưng nằm sau trong danh sách.
+    Trả về {"updated": số dòng cập nhật, "relinked": số dòng đổi đường dẫn,
+            "missing": tổng số văn bản hiện đang thiếu file}.
+    """
+    stats = {"updated": 0, "missing": 0, "relinked": 0}
+    with get_conn(db_path, write=True) as conn:
+        if folder_key is not None:
+            conn.execute(
+                "UPDATE vanban SET file_missing = 1 WHERE file_key >= ? AND file_key < ?",
+                _prefix_range(folder_key),
+            )
+        for key in removed:
+            # Xóa 1 thư mục -> mọi file bên trong
+            conn.execute(
+                "UPDATE vanban SET file_missing = 1 "
+                "WHERE (file_key = ? OR (file_key >= ? AND file_key < ?)) AND file_missing = 0",
+                (key,) + _prefix_range(key),
+            )
+
+        new_files = []
+        for f in files:
+            # Nội dung đã trích trước lần đồng bộ đầu (content_key NULL) -> gắn phiên bản file
+            # hiện tại, để lần sửa file sau được trích lại (xem pending_content)
+            cur = conn.execute(
+                "UPDATE vanban SET file_size = ?, file_rev = ?, content_hash = ?, file_missing = 0, "
+                "content_key = COALESCE(content_key, CASE WHEN content_indexed_at IS NOT NULL "
+                "THEN COALESCE(?, ?) END) "
+                "WHERE file_key = ?",
+                (f["size"], f["rev"], f["content_hash"], f["content_hash"], f["rev"], f["path_lower"]),
+            )
+            if cur.rowcount:
+                stats["updated"] += cur.rowcount
+            else:
+                new_files.append(f)
+
+        for f in new_files:
+            moved = conn.execute(
+                f"SELECT id, {', '.join(VANBAN_FIELDS)} FROM vanban "
+                "WHERE content_hash = ? AND file_missing = 1",
+                (f["content_hash"],),
+            ).fetchall()
+            if not moved and unmatched is not None:
+                unmatched.append(f)
+            for r in moved:
+                row = dict(r, file_dinh_kem=f["path_display"])
+                conn.execute(
+                    "UPDATE vanban SET file_dinh_kem = ?, "
+                    + ", ".join(f"{c} = ?" for c in DERIVED_FIELDS)
+                    + ", file_size = ?, file_rev = ?, file_missing = 0 WHERE id = ?",
+                    (f["path_display"],) + _derived_values(row) + (f["size"], f["rev"], r["id"]),
+                )
+                stats["relinked"] += 1
+        stats["missing"] = conn.execute(
+            "SELECT COUNT(*) FROM vanban WHERE file_missing = 1 AND deleted_at IS NULL"
+        ).fetchone()[0]
+    return stats
+
+
+# =========================
+# Chuyển dữ liệu từ vanban.csv (1 lần)
+# =========================
+def _clean_path(val: str) -> str:
+    if not isinstance(val, str):
+        return ""
+    return val.replace("✅ Đã upload thành công tới:", "").strip()
+
+
+def _vn_to_iso(val: str) -> str:
+    """dd/mm/yyyy -> YYYY-MM-DD (chuỗi rỗng nếu không đọc được)."""
+    try:
+        return datetime.strptime((val or "").strip(), "%d/%m/%Y").date().isoformat()
+    except ValueError:
+        return ""
+
+
+@metrics.timed("db.import_csv")
+def import_csv(csv_path: str, db_path: str | None = None) -> int:
+    """
+    Nhập dữ liệu từ file CSV cũ (vanban.csv) vào SQLite.
+    - Chỉ chạy 1 lần cho mỗi file (đánh dấu trong bảng app_meta).
+    - Trả về số dòng đã nhập (0 nếu đã nhập trước đó / không có file).
+    """
+    if not os.path.exists(csv_path):
+        return 0
+
+    meta_key = f"csv_imported:{os.path.abspath(csv_path)}"
+    with get_conn(db_path, write=True) as conn:
+        if conn.execute("SELECT 1 FROM app_meta WHERE key = ?", (meta_key,)).fetchone():
+            return 0
+
+        rows = []
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            for rec in csv.DictReader(f):
+                row = {col: (rec.get(src) or "").strip() for src, col in _CSV_COLUMNS.items()}
+                # Bản CSV cũ chưa có cột NgayBH -> sinh từ "Ngày ban hành"
+                if not row["ngay_ban_hanh"]:
+                    row["ngay_ban_hanh"] = _vn_to_iso(rec.get("Ngày ban hành", ""))
+                path = _clean_path(row["file_dinh_kem"])
+                row["file_dinh_kem"] = path if path.startswith("/") else ""
+                rows.append(_row_values(row))
+
+        conn.executemany(_INSERT_SQL, rows)
+        conn.execute(
+            "INSERT INTO app_meta (key, value) VALUES (?, ?)",
+            (meta_key, datetime.now().isoformat(timespec="seconds")),
+        )
+    return len(rows)
@@ -0,0 +1,240 @@
+# drive_sheets.py
+import io
+import os
+import threading
+import mimetypes
+
+# Số dòng mỗi range khi đọc Sheet, số range mỗi lần gọi batchGet
+BATCH_ROWS = 5000
+RANGES_PER_CALL = 4
+# Kích thước mỗi chunk khi upload resumable (bội số của 256KB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Giới hạn của Google batch HTTP: tối đa 100 lệnh / batch
+BATCH_LIMIT = 100
+# Số dòng tối đa mỗi lần append vào Sheet
+APPEND_BATCH_ROWS = 500
+# Số lần googleapiclient tự thử lại lệnh append khi lỗi 5xx / 429 (backoff tăng dần)
+APPEND_RETRIES = 3
+
+
+class SheetCache:
+    """
+    Dữ liệu đã đọc của 1 Google Sheet + phiên bản file trên Drive lúc đọc.
+    Dùng chung giữa các phiên Streamlit (st.cache_resource) nên có khóa.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None      # "version" của file trên Drive
+        self.header = []
+        self.rows = []           # các dòng dữ liệu (không gồm header)
+
+
+def _file_version(drive, sheet_id: str) -> str:
+    """Phiên bản file Sheet trên Drive (tăng mỗi khi nội dung đổi) – 1 lệnh gọi rẻ."""
+    meta = drive.files().get(
+        fileId=sheet_id, fields="version, modifiedTime", supportsAllDrives=True
+    ).execute()
+    return str(meta.get("version") or meta.get("modifiedTime"))
+
+
+def _batch_get(sheets, sheet_id: str, ranges: list[str]) -> list[list]:
+    res = sheets.spreadsheets().values().batchGet(
+        spreadsheetId=sheet_id, ranges=ranges, majorDimension="ROWS"
+    ).execute()
+    return [vr.get("values", []) for vr in res.get("valueRanges", [])]
+
+
+def _read_rows_from(sheets, sheet_id: str, start: int, batch_rows: int, ranges_per_call: int) -> list[list]:
+    """
+    Đọc từ dòng `start` (1-based) tới hết dữ liệu, mỗi lần batchGet nhiều range
+    `start:start+batch_rows-1` (không giới hạn cố định 10000 dòng như trước).
+    Sheets bỏ các dòng trống ở cuối mỗi range, nên range trả về thiếu dòng chưa
+    phải là hết dữ liệu: chỉ dừng khi cả lần batchGet không có dòng nào; dòng
+    trống giữa các range được bù [] để số thứ tự dòng không bị lệch.
+    """
+    out, blank = [], 0
+    while True:
+        ranges = [
+            f"{start + k * batch_rows}:{start + (k + 1) * batch_rows - 1}"
+            for k in range(ranges_per_call)
+        ]
+        found = False
+        for values in _batch_get(sheets, sheet_id, ranges):
+            if not values:
+                blank += batch_rows
+                continue
+            found = True
+            out.extend([] for _ in range(blank))
+            out.extend(values)
+            blank = batch_rows - len(values)
+        if not found:
+            return out
+        start += ranges_per_call * batch_rows
+
+
+def read_sheet_values(
+    sheets,
+    drive,
+    sheet_id: str,
+    cache: SheetCache,
+    batch_rows: int = BATCH_ROWS,
+    ranges_per_call: int = RANGES_PER_CALL,
+) -> tuple[list, list[list]]:
+    """
+    Đọc Sheet (header, rows) có cache:
+    - File không đổi (version trên Drive như cũ) -> trả cache, chỉ tốn 1 lệnh metadata.
+    - File đổi: nếu header và dòng cuối đã cache vẫn y nguyên thì coi như chỉ
+      thêm dòng -> chỉ đọc các dòng mới; ngược lại đọc lại toàn bộ.
+    """
+    version = _file_version(drive, sheet_id)
+    with cache.lock:
+        if cache.version == version:
+            return cache.header, cache.rows
+
+        n = len(cache.rows)
+        if cache.version is not None and cache.header:
+            # Dòng 1 = header, dòng n+1 = dòng dữ liệu cuối đã cache
+            head, last = _batch_get(sheets, sheet_id, ["1:1", f"{n + 1}:{n + 1}"])
+            if head[:1] == [cache.header] and last[:1] == cache.rows[-1:]:
+                cache.rows = cache.rows + _read_rows_from(sheets, sheet_id, n + 2, batch_rows, ranges_per_call)
+                cache.version = version
+                return cache.header, cache.rows
+
+        values = _read_rows_from(sheets, sheet_id, 1, batch_rows, ranges_per_call)
+        cache.header = values[0] if values else []
+        cache.rows = values[1:]
+        cache.version = version
+        return cache.header, cache.rows
+
+
+# =========================
+# Upload Drive + ghi Sheet theo lô
+# =========================
+def _media_body(source, file_name: str, mimetype: str | None = None):
+    """Đường dẫn file -> MediaFileUpload; file-like/bytes -> MediaIoBaseUpload (stream, không ghi file tạm)."""
+    from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+
+    mimetype = mimetype or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    if isinstance(source, (str, os.PathLike)):
+        return MediaFileUpload(source, mimetype=mimetype, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    source.seek(0)
+    return MediaIoBaseUpload(source, mimetype=mimetype, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+
+
+def upload_file(drive, folder_id: str, source, file_name: str, mimetype: str | None = None) -> tuple[str, str]:
+    """
+    Upload 1 file vào thư mục Drive, lấy luôn webViewLink từ kết quả create
+    (không gọi files().get lần nữa). Trả về (file_id, webViewLink).
+    """
+    created = drive.files().create(
+        body={"name": file_name, "parents": [folder_id]},
+        media_body=_media_body(source, file_name, mimetype),
+        fields="id, webViewLink",
+        supportsAllDrives=True,
+    ).execute()
+    file_id = created["id"]
+    return file_id, created.get("webViewLink") or f"https://drive.google.com/file/d/{file_id}/view"
+
+
+def share_anyone_reader(drive, file_ids: list[str]) -> dict[str, Exception]:
+    """
+    Cho phép "Anyone with the link -> view" cho nhiều file, gộp thành batch HTTP
+    (tối đa BATCH_LIMIT lệnh / lần gọi). Không ném lỗi: trả về {file_id: lỗi}
+    cho các file chưa cấp được quyền (cả batch lỗi -> mọi file trong batch).
+    """
+    errors = {}
+
+    def _done(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+
+    for i in range(0, len(file_ids), BATCH_LIMIT):
+        batch = drive.new_batch_http_request(callback=_done)
+        for file_id in file_ids[i:i + BATCH_LIMIT]:
+            batch.add(
+                drive.permissions().create(
+                    fileId=file_id,
+                    body={"type": "anyone", "role": "reader"},
+                    fields="id",
+                    supportsAllDrives=True,
+                ),
+                request_id=file_id,
+            )
+        try:
+            batch.execute()
+        except Exception as e:
+            errors.update((file_id, e) for file_id in file_ids[i:i + BATCH_LIMIT] if file_id not in errors)
+    return errors
+
+
+class SheetAppender:
+    """
+    Hàng đợi dòng cần ghi vào Sheet: add() gom dòng, flush() ghi tất cả bằng
+    1 lệnh values().append (tự flush khi đủ max_rows dòng).
+    """
+
+    def __init__(self, sheets, sheet_id: str, max_rows: int = APPEND_BATCH_ROWS):
+        self._sheets = sheets
+        self._sheet_id = sheet_id
+        self._max_rows = max_rows
+        self._rows = []
+
+    def add(self, row: list) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self._max_rows:
+            self.flush()
+
+    def flush(self) -> int:
+        """Ghi các dòng đang chờ; lỗi thì giữ lại các dòng để flush() lần sau."""
+        rows, self._rows = self._rows, []
+        if rows:
+            try:
+                self._sheets.spreadsheets().values().append(
+                    spreadsheetId=self._sheet_id,
+                    range="A1",
+                    valueInputOption="USER_ENTERED",
+                    insertDataOption="INSERT_ROWS",
+                    body={"values": rows},
+                ).execute(num_retries=APPEND_RETRIES)
+            except Exception:
+                self._rows = rows + self._rows
+                raise
+        return len(rows)
+
+
+def save_documents(
+    drive, sheets, folder_id: str, sheet_id: str, docs: list[dict], on_progress=None
+) -> tuple[int, dict[str, Exception], dict[str, Exception]]:
+    """
+    Lưu nhiều văn bản: upload từng file lên Drive, ghi các dòng vào Sheet bằng
+    1 lệnh append, rồi cấp quyền xem cho tất cả bằng 1 batch.
+    - docs: [{"source", "name", "mimetype", "row"}]; "row" là các cột
+      Số văn bản | Tên văn bản | Ngày ban hành | Cơ quan ban hành (Link, FileID được thêm vào)
+    - on_progress(đã xong, tổng, tên file, lỗi|None)
+    Dòng của các file đã upload luôn được ghi (kể cả khi vòng upload bị ngắt),
+    để thử lại không upload trùng; lỗi cấp quyền không làm hỏng việc lưu.
+    Trả về (số dòng đã ghi, {tên file: lỗi upload}, {tên file chưa chia sẻ được: lỗi}).
+    """
+    appender = SheetAppender(sheets, sheet_id)
+    uploaded, errors = {}, {}
+    try:
+        for done, doc in enumerate(docs, start=1):
+            err = None
+            try:
+                file_id, link = upload_file(drive, folder_id, doc["source"], doc["name"], doc.get("mimetype"))
+                uploaded[file_id] = doc["name"]
+                appender.add(list(doc["row"]) + [link, file_id])
+            except Exception as e:
+                err = errors[doc["name"]] = e
+            if on_progress:
+                on_progress(done, len(docs), doc["name"], err)
+    finally:
+        appender.flush()
+
+    private = {}
+    if uploaded:
+        private = {uploaded[f]: e for f, e in share_anyone_reader(drive, list(uploaded)).items()}
+    return len(uploaded), errors, private
@@ -0,0 +1,89 @@
+# dropbox_sync.py
+from dropbox import files as dbx_files
+from dropbox.exceptions import ApiError
+
+import database
+from upload_to_dropbox import DEFAULT_FOLDER, _get_dbx
+
+
+def _cursor_key(folder: str) -> str:
+    return f"dropbox_cursor:{folder.lower()}"
+
+
+def _collect(result, files: list[dict], removed: list[str]) -> None:
+    for entry in result.entries:
+        if isinstance(entry, dbx_files.FileMetadata):
+            files.append({
+                "path_lower": entry.path_lower,
+                "path_display": entry.path_display,
+                "size": entry.size,
+                "rev": entry.rev,
+                "content_hash": entry.content_hash,
+            })
+        elif isinstance(entry, dbx_files.DeletedMetadata):
+            removed.append(entry.path_lower)
+
+
+def sync_folder(folder: str = DEFAULT_FOLDER, db_path: str | None = None) -> dict:
+    """
+    Đối chiếu sổ văn bản với thư mục Dropbox bằng files_list_folder + cursor.
+    - Lần đầu (chưa có cursor): liệt kê toàn bộ thư mục (đệ quy), văn bản nào
+      không còn file bị đánh dấu thiếu file.
+    - Các lần sau: files_list_folder_continue(cursor) chỉ trả về thay đổi kể từ
+      lần trước (thêm / sửa / xóa / đổi tên).
+    Mỗi văn bản được ghi lại size, rev, content_hash của file.
+    Cursor lưu trong bảng app_meta. Trả về thống kê (xem database.apply_file_changes).
+    YÊU CẦU QUYỀN: files.metadata.read
+    """
+    dbx = _get_dbx()
+    folder = "/" + folder.strip().strip("/")
+    key = _cursor_key(folder)
+    cursor = database.get_meta(key, db_path=db_path)
+
+    files, removed = [], []
+    full = cursor is None
+    totals = {"updated": 0, "relinked": 0, "changes": 0}
+    try:
+        if full:
+            result = dbx.files_list_folder(folder, recursive=True)
+        else:
+            result = dbx.files_list_folder_continue(cursor)
+    except ApiError as e:
+        err = e.error
+        if isinstance(err, dbx_files.ListFolderContinueError) and err.is_reset():
+            # Dropbox yêu cầu liệt kê lại từ đầu
+            database.set_meta(key, None, db_path=db_path)
+            return sync_folder(folder, db_path=db_path)
+        raise RuntimeError(f"Không đọc được thư mục Dropbox '{folder}': {e}")
+
+    # File mới chưa khớp văn bản nào ở các trang trước: khi đổi tên, file ở đường
+    # dẫn mới có thể tới trước lệnh xóa đường dẫn cũ (trang sau) -> đưa lại
+    # cùng các file bị xóa để vẫn nhận ra là đổi tên
+    unmatched = []
+    _collect(result, files, removed)
+    while result.has_more:
+        if not full:
+            # Ghi từng trang để lần chạy bị gián đoạn không phải làm lại từ đầu
+            _add(totals, _apply(files, removed, unmatched, None, db_path), files, removed)
+            database.set_meta(key, result.cursor, db_path=db_path)
+            files, removed = [], []
+        result = dbx.files_list_folder_continue(result.cursor)
+        _collect(result, files, removed)
+
+    stats = _apply(files, removed, unmatched, folder.lower() if full else None, db_path)
+    database.set_meta(key, result.cursor, db_path=db_path)
+    _add(totals, stats, files, removed)
+    return {**totals, "missing": stats["missing"], "full": full}
+
+
+def _apply(files: list, removed: list, unmatched: list, folder_key: str | None, db_path: str | None) -> dict:
+    """apply_file_changes cho 1 trang; trang có file bị xóa thì thử lại các file chưa khớp."""
+    if removed:
+        files, unmatched[:] = unmatched + files, []
+    return database.apply_file_changes(files, removed, folder_key=folder_key, db_path=db_path, unmatched=unmatched)
+
+
+def _add(totals: dict, stats: dict, files: list, removed: list) -> None:
+    totals["updated"] += stats["updated"]
+    totals["relinked"] += stats["relinked"]
+    totals["changes"] += len(files) + len(removed)
@@ -0,0 +1,349 @@
+# export_engine.py
+import os
+import csv
+import time
+import zipfile
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date
+from typing import Callable, Iterable, Iterator
+
+import database
+import metrics
+from common import unique_name
+
+# Cột xuất: cột SQLite -> tiêu đề (giống bảng hiển thị)
+EXPORT_COLUMNS = {
+    "so_van_ban": "Số văn bản",
+    "tieu_de": "Tiêu đề",
+    "co_quan": "Cơ quan",
+    "linh_vuc": "Lĩnh vực",
+    "file_dinh_kem": "File Dropbox",
+    "ngay_ban_hanh": "Ngày ban hành",   # ISO -> dd/mm/yyyy khi xuất
+}
+
+# Định dạng: (MIME, đuôi file)
+FORMATS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+SHEET_NAME = "DanhSach"
+# Số dòng đọc từ SQLite mỗi lô
+CHUNK_SIZE = 2000
+# Độ rộng cột Excel ước lượng trên SAMPLE_ROWS dòng đầu (không duyệt mọi ô)
+SAMPLE_ROWS = 500
+MIN_WIDTH, MAX_WIDTH = 12, 40
+
+# ZIP file đính kèm: số file tải song song, thư mục chứa file trong ZIP
+ZIP_WORKERS = int(os.environ.get("ZIP_WORKERS", "4"))
+ZIP_FILES_DIR = "tep_dinh_kem"
+
+# File xuất nằm trong 1 thư mục riêng; file cũ hơn EXPORT_TTL giây bị dọn (sweep)
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "vanban_exports"))
+EXPORT_TTL = int(os.environ.get("EXPORT_TTL", "3600"))
+# Giới hạn dung lượng file xuất: st.download_button nạp cả file vào bộ nhớ
+# (media storage của Streamlit) khi tải về, nên không cho tạo file lớn hơn
+EXPORT_MAX_MB = int(os.environ.get("EXPORT_MAX_MB", "500"))
+
+# Xuất file chạy nền, không chặn lượt chạy của giao diện
+_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vanban-export")
+
+
+def _temp_file(prefix: str, suffix: str) -> str:
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=EXPORT_DIR)
+    os.close(fd)
+    return path
+
+
+def _check_size(nbytes: int) -> None:
+    if nbytes > EXPORT_MAX_MB * 1024 * 1024:
+        raise RuntimeError(
+            f"File xuất vượt giới hạn {EXPORT_MAX_MB} MB (EXPORT_MAX_MB), hãy lọc bớt kết quả rồi xuất lại."
+        )
+
+
+def read_export(path: str) -> bytes:
+    """Nội dung file xuất cho st.download_button (đã kiểm tra EXPORT_MAX_MB)."""
+    with open(path, "rb") as f:
+        _check_size(os.fstat(f.fileno()).st_size)
+        return f.read()
+
+
+def sweep(ttl: int = EXPORT_TTL) -> int:
+    """
+    Xóa các file xuất cũ hơn ttl giây trong EXPORT_DIR (phiên đã đóng không
+    tự xóa file của mình). Gọi mỗi lần bắt đầu xuất. Trả về số file đã xóa.
+    """
+    cutoff = time.time() - ttl
+    removed = 0
+    try:
+        entries = list(os.scandir(EXPORT_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def _vn_date(iso) -> str:
+    try:
+        return date.fromisoformat(iso or "").strftime("%d/%m/%Y")
+    except ValueError:
+        return ""
+
+
+def _records(chunks: Iterable[list]) -> Iterator[list[list]]:
+    """Lô dòng SQLite -> lô list giá trị theo EXPORT_COLUMNS (chuỗi rỗng thay NULL)."""
+    for rows in chunks:
+        yield [
+            [_vn_date(r[c]) if c == "ngay_ban_hanh" else (r[c] or "") for c in EXPORT_COLUMNS]
+            for r in rows
+        ]
+
+
+def _column_widths(sample: list[list]) -> list[int]:
+    widths = []
+    for i, header in enumerate(EXPORT_COLUMNS.values()):
+        longest = max([len(header)] + [len(str(row[i])) for row in sample])
+        widths.append(min(MAX_WIDTH, max(MIN_WIDTH, int(longest * 1.1))))
+    return widths
+
+
+def _peek(batches: Iterator[list[list]]) -> tuple[list[list], Iterator[list[list]]]:
+    """Lấy SAMPLE_ROWS dòng đầu để ước lượng độ rộng, trả lại iterator đầy đủ."""
+    head, sample = [], []
+    for batch in batches:
+        head.append(batch)
+        sample.extend(batch)
+        if len(sample) >= SAMPLE_ROWS:
+            break
+
+    def _all():
+        yield from head
+        yield from batches
+
+    return sample[:SAMPLE_ROWS], _all()
+
+
+def _write_csv(batches, out_path: str) -> None:
+    # utf-8-sig để Excel mở đúng tiếng Việt
+    with open(out_path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(EXPORT_COLUMNS.values())
+        for batch in batches:
+            w.writerows(batch)
+
+
+def _write_xlsx(batches, out_path: str) -> None:
+    """openpyxl write-only (không giữ ô trong bộ nhớ) -> xlsxwriter constant_memory."""
+    sample, batches = _peek(batches)
+    widths = _column_widths(sample)
+    try:
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+    except ImportError:
+        import xlsxwriter
+
+        wb = xlsxwriter.Workbook(out_path, {"constant_memory": True})
+        ws = wb.add_worksheet(SHEET_NAME)
+        for i, width in enumerate(widths):
+            ws.set_column(i, i, width)
+        ws.write_row(0, 0, list(EXPORT_COLUMNS.values()))
+        n = 1
+        for batch in batches:
+            for row in batch:
+                ws.write_row(n, 0, row)
+                n += 1
+        wb.close()
+        return
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.append(list(EXPORT_COLUMNS.values()))
+    for batch in batches:
+        for row in batch:
+            ws.append(row)
+    wb.save(out_path)
+
+
+def _write_parquet(batches, out_path: str) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Xuất Parquet cần cài thêm pyarrow (pip install pyarrow).")
+
+    names = list(EXPORT_COLUMNS.values())
+    schema = pa.schema([(n, pa.string()) for n in names])
+    with pq.ParquetWriter(out_path, schema) as writer:
+        for batch in batches:
+            cols = list(zip(*batch)) if batch else [()] * len(names)
+            writer.write_table(pa.table([pa.array(c, pa.string()) for c in cols], schema=schema))
+
+
+_WRITERS = {"xlsx": _write_xlsx, "csv": _write_csv, "parquet": _write_parquet}
+
+
+def export_rows(chunks: Iterable[list], fmt: str, out_path: str) -> str:
+    """Ghi các lô dòng (sqlite3.Row / dict theo cột SQLite) ra file định dạng fmt."""
+    if fmt not in _WRITERS:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    _WRITERS[fmt](_records(chunks), out_path)
+    return out_path
+
+
+def export_filtered(
+    flt: database.VanbanFilter,
+    fmt: str = "xlsx",
+    chunk_size: int = CHUNK_SIZE,
+    db_path: str | None = None,
+) -> tuple[str, str, str]:
+    """
+    Xuất kết quả lọc ra file tạm, đọc SQLite theo lô (database.iter_vanban).
+    Trả về (đường dẫn file tạm, MIME, tên file tải về). File tạm nằm trong EXPORT_DIR:
+    người gọi xóa khi không dùng nữa, nếu không sweep() dọn sau EXPORT_TTL giây.
+    """
+    mime, ext = FORMATS[fmt]
+    out_path = _temp_file("vanban_loc_", f".{ext}")
+    try:
+        chunks = database.iter_vanban(
+            flt, columns=tuple(EXPORT_COLUMNS), chunk_size=chunk_size, db_path=db_path
+        )
+        export_rows(chunks, fmt, out_path)
+        _check_size(os.path.getsize(out_path))
+    except BaseException:
+        os.remove(out_path)
+        raise
+    return out_path, mime, f"vanban_loc.{ext}"
+
+
+def submit_export(flt: database.VanbanFilter, fmt: str = "xlsx", db_path: str | None = None) -> Future:
+    """Chạy export_filtered trên thread nền; Future trả về như export_filtered."""
+    sweep()
+    return _EXECUTOR.submit(export_filtered, flt, fmt, db_path=db_path)
+
+
+# =========================
+# ZIP toàn bộ file đính kèm của kết quả lọc
+# =========================
+def _download_all(download: Callable[[str], str], paths: list[str], workers: int) -> Iterator[tuple[str, object]]:
+    """
+    Tải song song tối đa `workers` file, trả về (đường dẫn, file cục bộ | lỗi) theo thứ tự
+    xong trước. Chỉ giữ tối đa 2 * workers lệnh đang chờ (không tạo Future cho mọi file).
+    """
+    pending = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vanban-zip") as pool:
+        running = {}
+        for path in pending:
+            running[pool.submit(download, path)] = path
+            if len(running) >= 2 * workers:
+                break
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                path = running.pop(fut)
+                err = fut.exception()
+                yield path, (fut.result() if err is None else err)
+                nxt = next(pending, None)
+                if nxt is not None:
+                    running[pool.submit(download, nxt)] = nxt
+
+
+@metrics.timed("export.zip")
+def export_attachments(
+    flt: database.VanbanFilter,
+    download: Callable[[str], str],
+    progress: dict | None = None,
+    workers: int = ZIP_WORKERS,
+    chunk_size: int = CHUNK_SIZE,
+    db_path: str | None = None,
+) -> tuple[str, str, str]:
+    """
+    Gói mọi file đính kèm của kết quả lọc + bảng danh sách (xlsx) vào 1 file ZIP tạm.
+    - download(path) -> file cục bộ (Storage.download: dùng lại bản trong blob_cache)
+    - File được chép thẳng từ đĩa vào ZIP (không nén lại PDF/DOCX, không nạp cả file
+      vào bộ nhớ). File dùng chung cho nhiều văn bản chỉ có 1 bản.
+    - progress: dict được cập nhật {"done", "total"} để giao diện hiển thị tiến độ
+    - File tải lỗi được liệt kê trong loi_tai_file.txt, không làm hỏng cả gói.
+    - Dừng ngay (RuntimeError) khi gói vượt EXPORT_MAX_MB, không tải tiếp.
+    Trả về (đường dẫn file tạm, MIME, tên file tải về). File tạm nằm trong EXPORT_DIR:
+    người gọi xóa khi không dùng nữa, nếu không sweep() dọn sau EXPORT_TTL giây.
+    """
+    progress = progress if progress is not None else {}
+    progress.update(done=0, total=None)
+    out_path = _temp_file("vanban_dinh_kem_", ".zip")
+    sheet_path = _temp_file("vanban_loc_", ".xlsx")
+
+    paths = {}
+
+    def _collect(chunks):
+        # Lấy danh sách file ngay trong lượt đọc SQLite để ghi bảng danh sách
+        for rows in chunks:
+            for r in rows:
+                path = r["file_dinh_kem"] or ""
+                if path.startswith("/") and not r["file_missing"]:
+                    paths.setdefault(path.lower(), path)
+            yield rows
+
+    try:
+        chunks = database.iter_vanban(
+            flt, columns=tuple(EXPORT_COLUMNS) + ("file_missing",), chunk_size=chunk_size, db_path=db_path
+        )
+        export_rows(_collect(chunks), "xlsx", sheet_path)
+        progress["total"] = len(paths)
+
+        names, errors = set(), []
+        size = os.path.getsize(sheet_path)
+        with zipfile.ZipFile(out_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            zf.write(sheet_path, "danh_sach.xlsx", compress_type=zipfile.ZIP_DEFLATED)
+            for path, local in _download_all(download, list(paths.values()), workers):
+                if not isinstance(local, Exception) and os.path.exists(local):
+                    size += os.path.getsize(local)
+                    _check_size(size)
+                try:
+                    if isinstance(local, Exception):
+                        raise local
+                    # Trùng tên (khác thư mục trên Dropbox) -> "a (1).pdf"
+                    base, n = os.path.basename(path), 0
+                    while unique_name(base, n).lower() in names:
+                        n += 1
+                    name = unique_name(base, n)
+                    try:
+                        zf.write(local, f"{ZIP_FILES_DIR}/{name}")
+                    except FileNotFoundError:
+                        # Bản trong cache vừa bị dọn (evict) -> tải lại
+                        zf.write(download(path), f"{ZIP_FILES_DIR}/{name}")
+                    names.add(name.lower())
+                except Exception as e:
+                    errors.append(f"{path}: {e}")
+                progress["done"] += 1
+            if errors:
+                zf.writestr("loi_tai_file.txt", "\n".join(errors), compress_type=zipfile.ZIP_DEFLATED)
+        progress["errors"] = len(errors)
+    except BaseException:
+        os.remove(out_path)
+        raise
+    finally:
+        os.remove(sheet_path)
+    return out_path, "application/zip", "vanban_dinh_kem.zip"
+
+
+def submit_attachments(
+    flt: database.VanbanFilter,
+    download: Callable[[str], str],
+    db_path: str | None = None,
+) -> tuple[Future, dict]:
+    """Chạy export_attachments trên thread nền; trả về (Future, dict tiến độ)."""
+    sweep()
+    progress = {"done": 0, "total": None}
+    return _EXECUTOR.submit(export_attachments, flt, download, progress, db_path=db_path), progress
@@ -0,0 +1,276 @@
+# fakes.py
+"""
+Bản giả lập (trong bộ nhớ) của Dropbox và Google Drive/Sheets để đo hiệu năng
+và chạy thử không cần mạng. Độ trễ và lỗi được "tiêm" qua FaultInjector.
+
+- MemoryStorage: backend storage.Storage (thay cho upload_to_dropbox / dropbox_sync)
+- FakeGoogle: .drive / .sheets có cùng cách gọi với service của googleapiclient
+  mà drive_sheets dùng (files, permissions, batch HTTP, values.batchGet/append)
+"""
+import os
+import time
+import random
+import hashlib
+import threading
+
+import blob_cache
+import database
+from common import unique_name
+from storage import Storage, content_hash
+
+
+class FakeError(Exception):
+    """Lỗi được tiêm ngẫu nhiên (giả lập lỗi mạng / 5xx)."""
+
+
+class FaultInjector:
+    """
+    Mỗi lệnh gọi API giả: chờ latency (+ jitter ngẫu nhiên) giây rồi
+    ném FakeError với xác suất error_rate (luôn ném với các lệnh trong fail_ops,
+    ví dụ {"batch"}). Đếm số lệnh gọi theo tên.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+        fail_ops: set[str] | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fail_ops = set(fail_ops or ())
+        self.calls: dict[str, int] = {}
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def hit(self, op: str) -> None:
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+            delay = self.latency + (self._rnd.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = op in self.fail_ops or (self.error_rate and self._rnd.random() < self.error_rate)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeError(f"Lỗi giả lập: {op}")
+
+
+def _read_source(source) -> bytes:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    source.seek(0)
+    return source.read()
+
+
+# =========================
+# Dropbox giả (storage backend)
+# =========================
+class MemoryStorage(Storage):
+    """Lưu file trong dict {path_lower: (path_display, bytes)}; mỗi thao tác đi qua FaultInjector."""
+
+    name = "memory"
+    default_folder = "/van_ban"
+
+    def __init__(self, faults: FaultInjector | None = None):
+        self.faults = faults or FaultInjector()
+        self.files: dict[str, tuple[str, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def upload(self, source, file_name: str, folder: str | None = None) -> str:
+        data = _read_source(source)
+        self.faults.hit("upload")
+        folder = (folder or self.default_folder).strip("/")
+        with self._lock:
+            n = 0
+            while True:
+                path = "/" + "/".join(p for p in (folder, unique_name(file_name, n)) if p)
+                if path.lower() not in self.files:
+                    break
+                n += 1
+            self.files[path.lower()] = (path, data)
+        return path
+
+    def download(self, path: str) -> str:
+        # Giống Dropbox: tải 1 lần vào blob_cache, lần sau đọc từ cache
+        data = self.download_bytes(path)
+        key = hashlib.sha256(path.lower().encode("utf-8")).hexdigest()
+        cached = blob_cache.get(key)
+        if cached:
+            return cached
+        tmp = blob_cache.temp_path()
+        with open(tmp, "wb") as f:
+            f.write(data)
+        return blob_cache.put_file(key, tmp)
+
+    def download_bytes(self, path: str) -> bytes:
+        self.faults.hit("download")
+        with self._lock:
+            entry = self.files.get(path.lower())
+        if entry is None:
+            raise FileNotFoundError(path)
+        return entry[1]
+
+    def delete(self, path: str, missing_ok: bool = False) -> None:
+        self.faults.hit("delete")
+        with self._lock:
+            if self.files.pop(path.lower(), None) is None and not missing_ok:
+                raise FileNotFoundError(path)
+
+    def sync(self, folder: str | None = None, db_path: str | None = None) -> dict:
+        self.faults.hit("list_folder")
+        folder = "/" + (folder or self.default_folder).strip("/").lower()
+        with self._lock:
+            files = [
+                {
+                    "path_lower": key,
+                    "path_display": display,
+                    "size": len(data),
+                    "rev": hashlib.md5(data).hexdigest()[:9],
+                    "content_hash": content_hash(data),
+                }
+                for key, (display, data) in self.files.items()
+                if key.startswith(folder + "/")
+            ]
+        stats = database.apply_file_changes(files, [], folder_key=folder, db_path=db_path)
+        return {**stats, "changes": len(files), "full": True}
+
+
+# =========================
+# Google Drive / Sheets giả
+# =========================
+class _Call:
+    """Tương đương HttpRequest của googleapiclient: .execute() mới thực sự chạy."""
+
+    def __init__(self, faults: FaultInjector, op: str, fn):
+        self._faults = faults
+        self._op = op
+        self._fn = fn
+
+    def execute(self, num_retries: int = 0):
+        # Như googleapiclient: thử lại tối đa num_retries lần khi lỗi tạm thời
+        for attempt in range(num_retries + 1):
+            try:
+                self._faults.hit(self._op)
+                break
+            except FakeError:
+                if attempt == num_retries:
+                    raise
+        return self._fn()
+
+
+class _Batch:
+    """Batch HTTP: gộp nhiều lệnh thành 1 lần gọi (1 lần trễ), lỗi trả về từng lệnh qua callback."""
+
+    def __init__(self, faults: FaultInjector, callback):
+        self._faults = faults
+        self._callback = callback
+        self._calls = []
+
+    def add(self, request: _Call, request_id: str | None = None) -> None:
+        self._calls.append((request_id or str(len(self._calls)), request))
+
+    def execute(self) -> None:
+        self._faults.hit("batch")
+        for request_id, call in self._calls:
+            try:
+                result, err = call._fn(), None
+            except Exception as e:
+                result, err = None, e
+            if self._callback:
+                self._callback(request_id, result, err)
+
+
+class _Resource:
+    """Nhóm lệnh (files(), permissions(), spreadsheets(), values()) – mỗi lệnh là 1 method."""
+
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+
+class FakeGoogle:
+    """
+    Drive + Sheets giả dùng chung dữ liệu: append vào Sheet làm tăng "version"
+    của file Sheet trên Drive (như Google thật), để đo cả đường đọc có cache.
+    """
+
+    def __init__(self, faults: FaultInjector | None = None, sheet_id: str = "sheet"):
+        self.faults = faults or FaultInjector()
+        self.sheet_id = sheet_id
+        self.rows: list[list] = []         # dòng 1 = header
+        self.version = 1
+        self.files: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.drive = _Resource(
+            files=lambda: _Resource(create=self._create, get=self._get, delete=self._delete),
+            permissions=lambda: _Resource(create=self._permission),
+            new_batch_http_request=lambda callback=None: _Batch(self.faults, callback),
+        )
+        self.sheets = _Resource(
+            spreadsheets=lambda: _Resource(
+                values=lambda: _Resource(batchGet=self._batch_get, append=self._append)
+            )
+        )
+
+    # ---- Drive ----
+    def _create(self, body, media_body=None, fields=None, **kw):
+        def run():
+            data = b""
+            if media_body is not None:
+                stream = media_body.stream()
+                stream.seek(0)
+                data = stream.read()
+            with self._lock:
+                file_id = f"f{len(self.files) + 1}"
+                self.files[file_id] = {"name": body.get("name"), "data": data, "public": False}
+            return {"id": file_id, "webViewLink": f"https://drive.google.com/file/d/{file_id}/view"}
+        return _Call(self.faults, "drive.create", run)
+
+    def _get(self, fileId, fields=None, **kw):
+        def run():
+            if fileId == self.sheet_id:
+                return {"version": str(self.version), "modifiedTime": str(self.version)}
+            if fileId not in self.files:
+                raise FakeError(f"File not found: {fileId}")
+            return {"id": fileId, "name": self.files[fileId]["name"]}
+        return _Call(self.faults, "drive.get", run)
+
+    def _delete(self, fileId, **kw):
+        def run():
+            with self._lock:
+                self.files.pop(fileId, None)
+        return _Call(self.faults, "drive.delete", run)
+
+    def _permission(self, fileId, body, **kw):
+        def run():
+            if fileId not in self.files:
+                raise FakeError(f"File not found: {fileId}")
+            self.files[fileId]["public"] = True
+            return {"id": "anyoneWithLink"}
+        return _Call(self.faults, "drive.permission", run)
+
+    # ---- Sheets ----
+    def _batch_get(self, spreadsheetId, ranges, majorDimension="ROWS", **kw):
+        def run():
+            out = []
+            for rng in ranges:
+                start, end = (int(x) for x in rng.split(":"))
+                values = self.rows[start - 1:end]
+                # Như Sheets thật: bỏ các dòng trống ở cuối range
+                while values and not any(values[-1]):
+                    values = values[:-1]
+                out.append({"range": rng, "values": values} if values else {"range": rng})
+            return {"valueRanges": out}
+        return _Call(self.faults, "sheets.batchGet", run)
+
+    def _append(self, spreadsheetId, range, body, **kw):
+        def run():
+            with self._lock:
+                self.rows.extend(list(r) for r in body["values"])
+                self.version += 1
+            return {"updates": {"updatedRows": len(body["values"])}}
+        return _Call(self.faults, "sheets.append", run)
@@ -0,0 +1,161 @@
+# google_clients.py
+import os
+import re
+import json
+import threading
+from urllib.parse import urlsplit
+
+import metrics
+from common import setting
+
+# Các thư viện Google (googleapiclient, google.auth, httplib2) chỉ import khi tạo
+# client lần đầu, không làm chậm lúc khởi động app.
+
+SCOPES = [
+    "https://www.googleapis.com/auth/drive",
+    "https://www.googleapis.com/auth/spreadsheets",
+]
+
+# Credentials dùng chung cả tiến trình: token OAuth được làm mới khi hết hạn
+# và dùng lại giữa các lần gọi (không ký JWT / xin token mỗi lần upload).
+_CREDS = None
+_CREDS_LOCK = threading.Lock()
+# Tài liệu discovery (đọc 1 lần từ bản đóng gói sẵn trong googleapiclient, không gọi mạng)
+_DOCS: dict[tuple[str, str], str] = {}
+# Service và pool Http dùng chung cả tiến trình (xem _HttpPool)
+_POOL = None
+_SERVICES: dict[tuple[str, str], object] = {}
+_SERVICES_LOCK = threading.Lock()
+# Số Http rảnh tối đa giữ lại trong pool (mỗi cái giữ kết nối keep-alive riêng)
+HTTP_POOL_SIZE = int(os.environ.get("GOOGLE_HTTP_POOL_SIZE", "8"))
+# Đoạn đường dẫn giữ lại khi đặt tên lệnh gọi (bỏ ID file / sheet để số nhãn không tăng mãi)
+_API_WORD = re.compile(r"[A-Za-z]+|v\d+(beta\d*)?")
+
+
+def get_creds():
+    """Service account từ GOOGLE_CREDENTIALS (chuỗi JSON hoặc bảng trong secrets.toml)."""
+    global _CREDS
+    if _CREDS is None:
+        with _CREDS_LOCK:
+            if _CREDS is None:
+                info = setting("GOOGLE_CREDENTIALS")
+                if not info:
+                    raise KeyError("Thiếu key `GOOGLE_CREDENTIALS` trong secrets.")
+                info = json.loads(info) if isinstance(info, str) else dict(info)
+                from google.oauth2 import service_account
+                _CREDS = service_account.Credentials.from_service_account_info(info, scopes=SCOPES)
+    return _CREDS
+
+
+def _api_op(method: str, uri: str) -> str:
+    """Tên lệnh gọi cho metrics: "GET drive/v3/files", "POST sheets/v4/spreadsheets/values/append" ..."""
+    parts = urlsplit(uri)
+    host = parts.hostname or ""
+    words = [] if host.startswith("www.") else [host.split(".")[0]]
+    for seg in parts.path.strip("/").split("/"):
+        words.extend(w for w in seg.split(":") if _API_WORD.fullmatch(w))
+    return f"{method} {'/'.join(words)}"
+
+
+def _metered_http(timeout: float):
+    """httplib2.Http đếm từng lệnh gọi HTTP (kể cả làm mới token) và số byte gửi / nhận."""
+    import httplib2
+
+    class _MeteredHttp(httplib2.Http):
+        def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+            metrics.count("api_calls", service="google", op=_api_op(method, uri))
+            if isinstance(body, (bytes, str)) and body:
+                metrics.count("bytes_up", len(body), service="google")
+            resp, content = super().request(uri, method, body, headers, *args, **kwargs)
+            if content:
+                metrics.count("bytes_down", len(content), service="google")
+            return resp, content
+
+    http = _MeteredHttp(timeout=timeout)
+    # Như googleapiclient.http.build_http: 308 là "resume incomplete" của upload
+    # resumable, không phải chuyển hướng
+    http.redirect_codes = http.redirect_codes - {308}
+    return http
+
+
+class _HttpPool:
+    """
+    Thay cho Http khi tạo service: mỗi request mượn 1 AuthorizedHttp rảnh
+    (httplib2.Http không an toàn đa luồng nên mỗi lúc chỉ 1 thread dùng), xong
+    thì trả lại pool. Streamlit chạy mỗi lượt rerun trên 1 thread mới, nên Http
+    (và kết nối keep-alive) phải gắn với tiến trình, không gắn với thread.
+    """
+
+    def __init__(self, timeout: float, size: int = HTTP_POOL_SIZE):
+        self._timeout = timeout
+        self._size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @property
+    def credentials(self):
+        # googleapiclient đọc để làm mới token khi batch trả về 401
+        return get_creds()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        from google_auth_httplib2 import AuthorizedHttp
+        return AuthorizedHttp(get_creds(), http=_metered_http(self._timeout))
+
+    def _release(self, http) -> None:
+        with self._lock:
+            if len(self._idle) < self._size:
+                self._idle.append(http)
+                return
+        http.close()
+
+    def request(self, *args, **kwargs):
+        http = self._acquire()
+        try:
+            return http.request(*args, **kwargs)
+        finally:
+            self._release(http)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for http in idle:
+            http.close()
+
+
+def _discovery_doc(name: str, version: str) -> str:
+    key = (name, version)
+    if key not in _DOCS:
+        from googleapiclient import discovery_cache
+        doc = discovery_cache.get_static_doc(name, version)
+        if doc is None:
+            raise RuntimeError(f"Không có discovery document cho {name} {version}")
+        _DOCS[key] = doc
+    return _DOCS[key]
+
+
+def _service(name: str, version: str):
+    """Service dùng chung cả tiến trình (tạo 1 lần), gọi API qua _HttpPool."""
+    global _POOL
+    key = (name, version)
+    svc = _SERVICES.get(key)
+    if svc is None:
+        with _SERVICES_LOCK:
+            svc = _SERVICES.get(key)
+            if svc is None:
+                from googleapiclient.discovery import build_from_document
+
+                if _POOL is None:
+                    _POOL = _HttpPool(float(setting("GOOGLE_TIMEOUT", 120)))
+                svc = _SERVICES[key] = build_from_document(_discovery_doc(name, version), http=_POOL)
+    return svc
+
+
+def drive_service():
+    return _service("drive", "v3")
+
+
+def sheets_service():
+    return _service("sheets", "v4")
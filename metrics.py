@@ -0,0 +1,172 @@
+# metrics.py
+"""
+Đo thời gian các bước nóng (span) và đếm lệnh gọi API / số byte, dùng chung cả tiến trình.
+
+- with metrics.span("ui.query_page"): ...      # hoặc @metrics.timed("db.insert_many")
+- metrics.count("api_calls", service="dropbox", op="files/upload")
+- metrics.count("bytes_up", 1024, service="dropbox")
+- snapshot() / prometheus_text() / jsonl_snapshot(): xem hoặc xuất số liệu
+- METRICS_LOG=<file>: ghi thêm từng span / counter ra file JSON-lines
+- start_profile() / stop_profile(): cProfile cho 1 lượt chạy lại của Streamlit
+"""
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+# Ngưỡng histogram (ms) cho xuất Prometheus
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+METRICS_LOG = os.environ.get("METRICS_LOG")
+
+_LOCK = threading.Lock()
+_SPANS: dict[str, dict] = {}
+_COUNTERS: dict[tuple, float] = {}
+_LOG = None
+_STARTED = time.time()
+# Kết quả cProfile gần nhất (chuỗi pstats), xem ở trang admin
+last_profile: str | None = None
+
+
+def _log(event: dict) -> None:
+    global _LOG
+    if not METRICS_LOG:
+        return
+    line = json.dumps({"t": round(time.time(), 3), **event}, ensure_ascii=False)
+    with _LOCK:
+        if _LOG is None:
+            _LOG = open(METRICS_LOG, "a", encoding="utf-8", buffering=1)
+        _LOG.write(line + "\n")
+
+
+def observe(name: str, ms: float) -> None:
+    """Ghi nhận 1 lần chạy của span `name` mất `ms` mili giây."""
+    with _LOCK:
+        s = _SPANS.get(name)
+        if s is None:
+            s = _SPANS[name] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0,
+                                "buckets": [0] * len(BUCKETS_MS)}
+        s["count"] += 1
+        s["total_ms"] += ms
+        s["last_ms"] = ms
+        s["max_ms"] = max(s["max_ms"], ms)
+        for i, b in enumerate(BUCKETS_MS):
+            if ms <= b:
+                s["buckets"][i] += 1
+                break
+    _log({"span": name, "ms": round(ms, 3)})
+
+
+@contextmanager
+def span(name: str):
+    """Đo thời gian khối lệnh (ghi nhận cả khi có lỗi)."""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - t) * 1000)
+
+
+def timed(name: str):
+    """Decorator: đo mỗi lần gọi hàm bằng span(name)."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """Cộng dồn counter `name` theo nhãn (service=..., op=...)."""
+    key = (name, tuple(sorted(labels.items())))
+    with _LOCK:
+        _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+    _log({"counter": name, "value": value, **labels})
+
+
+def snapshot() -> dict:
+    """Bản sao số liệu hiện tại: {"uptime_s", "spans": {...}, "counters": [...]}."""
+    with _LOCK:
+        spans = {
+            name: {**{k: v for k, v in s.items() if k != "buckets"},
+                   "avg_ms": s["total_ms"] / s["count"] if s["count"] else 0.0}
+            for name, s in _SPANS.items()
+        }
+        counters = [{"name": n, **dict(labels), "value": v} for (n, labels), v in _COUNTERS.items()]
+    return {"uptime_s": round(time.time() - _STARTED, 1), "spans": spans, "counters": counters}
+
+
+def reset() -> None:
+    with _LOCK:
+        _SPANS.clear()
+        _COUNTERS.clear()
+
+
+def _prom_name(name: str) -> str:
+    return "vanban_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def _prom_labels(labels) -> str:
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+def prometheus_text() -> str:
+    """Số liệu theo định dạng text của Prometheus (histogram cho span, counter cho đếm)."""
+    lines = []
+    with _LOCK:
+        if _SPANS:
+            lines.append("# TYPE vanban_span_ms histogram")
+        for name, s in sorted(_SPANS.items()):
+            lbl = f'span="{name}"'
+            cumulative = 0
+            for b, n in zip(BUCKETS_MS, s["buckets"]):
+                cumulative += n
+                lines.append(f'vanban_span_ms_bucket{{{lbl},le="{b}"}} {cumulative}')
+            lines.append(f'vanban_span_ms_bucket{{{lbl},le="+Inf"}} {s["count"]}')
+            lines.append(f"vanban_span_ms_sum{{{lbl}}} {s['total_ms']:.3f}")
+            lines.append(f"vanban_span_ms_count{{{lbl}}} {s['count']}")
+        seen = set()
+        for (name, labels), value in sorted(_COUNTERS.items()):
+            metric = _prom_name(name) + "_total"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            lines.append(f"{metric}{_prom_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def jsonl_snapshot() -> str:
+    """Mỗi span / counter 1 dòng JSON (để tải về hoặc nối vào log)."""
+    snap = snapshot()
+    t = round(time.time(), 3)
+    lines = [json.dumps({"t": t, "span": n, **s}, ensure_ascii=False) for n, s in sorted(snap["spans"].items())]
+    lines += [json.dumps({"t": t, "counter": c.pop("name"), **c}, ensure_ascii=False) for c in snap["counters"]]
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# cProfile 1 lượt chạy
+# =========================
+def start_profile() -> cProfile.Profile:
+    prof = cProfile.Profile()
+    prof.enable()
+    return prof
+
+
+def stop_profile(prof: cProfile.Profile, limit: int = 40) -> str:
+    """Dừng profiler, lưu bảng pstats (sắp theo cumulative) vào last_profile."""
+    global last_profile
+    prof.disable()
+    buf = io.StringIO()
+    pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(limit)
+    last_profile = buf.getvalue()
+    return last_profile
@@ -1,21 +1,24 @@
 # qlvbdrive.py
 import os
-import io
-import json
-import tempfile
 from datetime import date, datetime
 
 import pandas as pd
 import streamlit as st
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+
+import admin_panel
+import metrics
+from drive_sheets import SheetCache, read_sheet_values, save_documents
+# Client Google dùng chung cả tiến trình (credentials cache, discovery tĩnh, pool AuthorizedHttp giữ keep-alive)
+from google_clients import drive_service, sheets_service
+from vn_text import fold, search_terms
 
 
 # =========================
 # Cấu hình trang + CSS
 # =========================
 st.set_page_config(page_title="Quản lý Văn bản - Google Drive + Sheets", layout="wide")
+# Đo thời gian cả lượt chạy (+ cProfile khi admin yêu cầu), xem ở ?admin=<ADMIN_TOKEN>
+_run = admin_panel.begin_run()
 st.markdown(
     """
 <style>
@@ -44,32 +47,10 @@ def _get_secret(key: str):
     return v
 
 
-GOOGLE_CREDENTIALS = _get_secret("GOOGLE_CREDENTIALS")
 SHEET_ID = _get_secret("SHEET_ID")
 FOLDER_ID = _get_secret("FOLDER_ID")
 
 
-# =========================
-# Google API Clients
-# =========================
-SCOPES = [
-    "https://www.googleapis.com/auth/drive",
-    "https://www.googleapis.com/auth/spreadsheets",
-]
-
-def get_creds():
-    creds_info = json.loads(GOOGLE_CREDENTIALS)
-    return service_account.Credentials.from_service_account_info(creds_info, scopes=SCOPES)
-
-@st.cache_resource(show_spinner=False)
-def drive_service():
-    return build("drive", "v3", credentials=get_creds())
-
-@st.cache_resource(show_spinner=False)
-def sheets_service():
-    return build("sheets", "v4", credentials=get_creds())
-
-
 # =========================
 # Helpers
 # =========================
@@ -77,68 +58,88 @@ def to_vn_date(d: date) -> str:
     """date -> dd/mm/yyyy"""
     return d.strftime("%d/%m/%Y")
 
-def upload_to_drive(folder_id: str, file_path: str, file_name: str):
+@metrics.timed("drive.save")
+def save_to_drive(docs: list[dict], on_progress=None):
     """
-    Upload 1 file vào thư mục Drive.
-    Trả về: file_id, webViewLink.
+    Upload các file lên Drive + ghi dòng vào Google Sheets theo lô
+    (xem drive_sheets.save_documents). Trả về (số dòng đã ghi, {tên file: lỗi},
+    {tên file chưa chia sẻ được: lỗi}).
     """
-    service = drive_service()
+    return save_documents(drive_service(), sheets_service(), FOLDER_ID, SHEET_ID, docs, on_progress=on_progress)
+
 
-    file_metadata = {"name": file_name, "parents": [folder_id]}
-    media = MediaFileUpload(file_path, resumable=True)
+@st.cache_resource(show_spinner=False)
+def _sheet_cache(sheet_id: str) -> SheetCache:
+    return SheetCache()
 
-    created = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields="id, webViewLink"
-    ).execute()
 
-    file_id = created["id"]
+@st.cache_resource(show_spinner=False)
+def _sheet_frames(sheet_id: str) -> dict:
+    return {}
 
-    # Cho phép Anyone with the link -> view
-    try:
-        service.permissions().create(
-            fileId=file_id,
-            body={"type": "anyone", "role": "reader"},
-        ).execute()
-    except Exception:
-        pass  # nếu quyền đã đủ thì bỏ qua
 
-    # Lấy lại link
-    meta = service.files().get(fileId=file_id, fields="webViewLink").execute()
-    return file_id, meta.get("webViewLink", f"https://drive.google.com/file/d/{file_id}/view")
+# Cột phụ (ẩn khi hiển thị): chuỗi tìm kiếm đã bỏ dấu + ngày ban hành dạng datetime
+SEARCH_COL = "_search"
+DATE_COL = "_ngay"
+HIDDEN_COLUMNS = [SEARCH_COL, DATE_COL]
 
 
-def append_row_to_sheet(sheet_id: str, row_values: list):
-    """
-    Ghi 1 dòng vào Google Sheets (append cuối bảng)
-    """
-    service = sheets_service()
-    body = {"values": [row_values]}
-    service.spreadsheets().values().append(
-        spreadsheetId=sheet_id,
-        range="A1",
-        valueInputOption="USER_ENTERED",
-        insertDataOption="INSERT_ROWS",
-        body=body,
-    ).execute()
+@metrics.timed("sheets.build_frame")
+def _build_frame(header: list, rows: list[list]) -> pd.DataFrame:
+    # Sheets bỏ các ô trống cuối dòng -> bù cho đủ số cột
+    width = len(header)
+    rows = [(r + [""] * (width - len(r)))[:width] for r in rows]
+    df = pd.DataFrame(rows, columns=header)
+
+    # Tính 1 lần cho mỗi phiên bản Sheet (không tính lại mỗi lần gõ phím)
+    text_cols = [c for c in df.columns if c != "Link"]
+    joined = df[text_cols[0]].astype(str) if text_cols else pd.Series("", index=df.index)
+    for c in text_cols[1:]:
+        joined = joined + " " + df[c].astype(str)
+    df[SEARCH_COL] = joined.map(fold)
+    df[DATE_COL] = pd.to_datetime(
+        df.get("Ngày ban hành", pd.Series("", index=df.index)), format="%d/%m/%Y", errors="coerce"
+    )
+    return df
 
 
+@metrics.timed("sheets.read")
 def read_sheet(sheet_id: str) -> pd.DataFrame:
     """
-    Đọc toàn bộ dữ liệu từ Sheet, trả về DataFrame với header dòng 1
+    Đọc toàn bộ dữ liệu từ Sheet (theo lô, không giới hạn 10000 dòng),
+    trả về DataFrame với header dòng 1 + cột tìm kiếm (HIDDEN_COLUMNS).
+    Chỉ đọc lại khi file trên Drive đổi, và chỉ đọc phần dòng mới nếu Sheet
+    chỉ được thêm dòng; DataFrame được dựng lại khi dữ liệu đổi.
     """
-    service = sheets_service()
-    res = service.spreadsheets().values().get(
-        spreadsheetId=sheet_id, range="A1:Z10000"
-    ).execute()
-    values = res.get("values", [])
-    if not values:
-        return pd.DataFrame(columns=["Số văn bản", "Tên văn bản", "Ngày ban hành", "Cơ quan ban hành", "Link", "FileID"])
+    header, rows = read_sheet_values(sheets_service(), drive_service(), sheet_id, _sheet_cache(sheet_id))
+    if not header:
+        header, rows = ["Số văn bản", "Tên văn bản", "Ngày ban hành", "Cơ quan ban hành", "Link", "FileID"], []
 
-    header = values[0]
-    rows = values[1:]
-    return pd.DataFrame(rows, columns=header)
+    frames = _sheet_frames(sheet_id)
+    # SheetCache thay list rows mới mỗi khi dữ liệu đổi -> so sánh theo identity
+    if frames.get("rows") is not rows or frames.get("header") != header:
+        frames.update(header=header, rows=rows, df=_build_frame(header, rows))
+    return frames["df"]
+
+
+@metrics.timed("sheets.filter")
+def filter_sheet(df: pd.DataFrame, keyword: str = "", co_quan=(), date_from=None, date_to=None) -> pd.DataFrame:
+    """
+    Lọc bằng phép toán trên cả cột (vectorized), tương tự quanlyvanban.py:
+    - keyword: nhiều từ (AND), không phân biệt dấu / hoa thường
+    - co_quan: danh sách cơ quan ban hành
+    - date_from / date_to: khoảng ngày ban hành (date)
+    """
+    mask = pd.Series(True, index=df.index)
+    for term in search_terms(keyword):
+        mask &= df[SEARCH_COL].str.contains(term, regex=False)
+    if co_quan and "Cơ quan ban hành" in df.columns:
+        mask &= df["Cơ quan ban hành"].isin(list(co_quan))
+    if date_from:
+        mask &= df[DATE_COL] >= pd.Timestamp(date_from)
+    if date_to:
+        mask &= df[DATE_COL] <= pd.Timestamp(date_to)
+    return df[mask]
 
 
 # =========================
@@ -155,43 +156,49 @@ with st.form("form_vanban", clear_on_submit=False):
 
     with cR:
         st.markdown("**Đính kèm (PDF/DOC/DOCX/XLS/XLSX …)**")
-        file_upload = st.file_uploader("", type=None)
-        st.caption("💡 Kéo–thả file vào đây. Dung lượng ≤ 200MB / tệp.")
+        file_uploads = st.file_uploader("", type=None, accept_multiple_files=True)
+        st.caption("💡 Kéo–thả file vào đây (chọn được nhiều file). Dung lượng ≤ 200MB / tệp.")
 
     submitted = st.form_submit_button("💾 Lưu văn bản", type="primary")
 
     if submitted:
-        if not file_upload:
+        if not file_uploads:
             st.error("Vui lòng chọn file đính kèm.")
         else:
-            # Lưu tạm rồi upload
-            suffix = os.path.splitext(file_upload.name)[1]
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                tmp.write(file_upload.read())
-                tmp_path = tmp.name
+            # Ghi dòng vào Google Sheet theo đúng thứ tự cột:
+            # Số văn bản | Tên văn bản | Ngày ban hành | Cơ quan ban hành | Link | FileID
+            # Nhiều file: dùng chung thông tin, Tên văn bản trống -> lấy tên file
+            docs = [
+                {
+                    "source": f,  # stream thẳng từ buffer của UploadedFile (không ghi file tạm)
+                    "name": f.name,
+                    "mimetype": f.type,
+                    "row": [
+                        so_vb.strip(),
+                        ten_vb.strip() or os.path.splitext(f.name)[0],
+                        to_vn_date(ngay_bh),
+                        cq_bh.strip(),
+                    ],
+                }
+                for f in file_uploads
+            ]
+            progress = st.progress(0.0, text="Đang upload…") if len(docs) > 1 else None
+
+            def _on_progress(done, total, name, err):
+                if progress:
+                    progress.progress(done / total, text=f"{done}/{total}: {name}")
 
             try:
-                file_id, web_link = upload_to_drive(FOLDER_ID, tmp_path, file_upload.name)
-                # Ghi dòng vào Google Sheet theo đúng thứ tự cột:
-                # Số văn bản | Tên văn bản | Ngày ban hành | Cơ quan ban hành | Link | FileID
-                row = [
-                    so_vb.strip(),
-                    ten_vb.strip(),
-                    to_vn_date(ngay_bh),
-                    cq_bh.strip(),
-                    web_link,
-                    file_id,
-                ]
-                append_row_to_sheet(SHEET_ID, row)
-                st.success("✅ Đã upload & ghi vào Google Sheets!")
-                st.toast("Hoàn tất!", icon="✅")
+                saved, errors, private = save_to_drive(docs, on_progress=_on_progress)
+                for name, err in errors.items():
+                    st.error(f"❌ {name}: {err}")
+                for name, err in private.items():
+                    st.warning(f"🔒 {name}: đã lưu nhưng chưa chia sẻ được link xem ({err})")
+                if saved:
+                    st.success(f"✅ Đã upload & ghi {saved} văn bản vào Google Sheets!")
+                    st.toast("Hoàn tất!", icon="✅")
             except Exception as e:
                 st.error(f"❌ Lỗi: {e}")
-            finally:
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
 
 
 st.markdown("---")
@@ -202,19 +209,33 @@ try:
     df = read_sheet(SHEET_ID)
 except Exception as e:
     st.error(f"Không đọc được Google Sheets: {e}")
-    df = pd.DataFrame(columns=["Số văn bản", "Tên văn bản", "Ngày ban hành", "Cơ quan ban hành", "Link", "FileID"])
-
-# Tìm kiếm cơ bản
-kw = st.text_input("🔎 Tìm kiếm", placeholder="Nhập số văn bản, tên văn bản, cơ quan…")
-show = df.copy()
-if kw:
-    k = kw.strip().lower()
-    show = show[show.apply(lambda r: any(k in str(x).lower() for x in r), axis=1)]
+    df = _build_frame(["Số văn bản", "Tên văn bản", "Ngày ban hành", "Cơ quan ban hành", "Link", "FileID"], [])
+
+# Tìm kiếm & bộ lọc
+with st.expander("🔎 Tìm kiếm & bộ lọc", expanded=True):
+    kw = st.text_input("🔎 Tìm kiếm", placeholder="Nhập số văn bản, tên văn bản, cơ quan…")
+    c1, c2 = st.columns([1, 1])
+    coquan_opts = sorted(v for v in df.get("Cơ quan ban hành", pd.Series(dtype=str)).dropna().unique() if str(v).strip())
+    sel_coquan = c1.multiselect("Cơ quan ban hành", coquan_opts)
+
+    dates = df[DATE_COL].dropna()
+    dt_min = dates.min().date() if not dates.empty else date.today()
+    dt_max = dates.max().date() if not dates.empty else date.today()
+    date_range = c2.date_input("Từ / Đến (ngày BH)", value=(dt_min, dt_max), format="DD/MM/YYYY")
+
+date_from, date_to = (date_range + (None, None))[:2] if isinstance(date_range, tuple) else (None, None)
+# Chỉ lọc theo ngày khi người dùng thu hẹp khoảng (giữ các dòng chưa có ngày)
+if (date_from, date_to) == (dt_min, dt_max):
+    date_from = date_to = None
+show = filter_sheet(df, kw, sel_coquan, date_from, date_to).drop(columns=HIDDEN_COLUMNS)
 
 # Hiển thị
-st.dataframe(show, use_container_width=True)
+with metrics.span("ui.table"):
+    st.dataframe(show, width="stretch")
 
 # Export CSV nhanh
 if not show.empty:
     csv_bytes = show.to_csv(index=False).encode("utf-8-sig")
     st.download_button("⬇️ Tải CSV", data=csv_bytes, file_name="quanly_vanban.csv", mime="text/csv")
+
+admin_panel.end_run("qlvbdrive", _run)
@@ -1,29 +1,34 @@
 # quanlyvanban.py
 import os
-import io
-import unicodedata
-import tempfile
-import pandas as pd
+import functools
 import streamlit as st
 from datetime import date
 
-from upload_to_dropbox import (
-    upload_file_to_dropbox,
-    download_bytes_from_dropbox,
-    delete_file_from_dropbox,
-)
+import admin_panel
+import blob_cache
+import bulk_ingest
+import database
+import export_engine
+import metrics
+from compactor import Compactor
+from text_index import TextIndexer
+# Backend lưu file chọn lúc chạy (STORAGE_BACKEND); SDK Dropbox chỉ import khi dùng tới
+from storage import get_storage
+
+# pandas chỉ import khi cần (bảng danh sách / đọc metadata), sau khi trang đã vẽ phần đầu
 
 # =========================
 # Cấu hình trang + CSS
 # =========================
 st.set_page_config(page_title="Quản lý Văn bản", layout="wide")
+# Đo thời gian cả lượt chạy (+ cProfile khi admin yêu cầu), xem ở ?admin=<ADMIN_TOKEN>
+_run = admin_panel.begin_run()
 st.markdown(
     """
 <style>
 .block-container {padding-top: 1rem; padding-bottom: 2rem;}
 .stTextInput>div>div>input, .stMultiSelect div[data-baseweb="select"] { min-height: 42px; }
 .stButton>button { padding: 0.35rem 0.7rem; border-radius: 8px; font-size: 0.9rem; }
-.btn-cell .stButton>button { padding: 0.25rem 0.55rem; font-size: 0.85rem; }
 .stDataFrame, .stTable { font-size: 0.92rem; }
 .badge { background:#eef3ff; color:#2c3e50; padding:2px 8px; border-radius:999px; font-size:.8rem; }
 hr { margin: 0.6rem 0; }
@@ -34,64 +39,162 @@ hr { margin: 0.6rem 0; }
 
 st.title("📚 Quản lý Văn bản - Dropbox")
 
-DATA_FILE = "vanban.csv"
+DATA_FILE = "vanban.csv"  # dữ liệu cũ, chỉ dùng để nhập 1 lần vào SQLite
+
+# Cột SQLite -> tên cột hiển thị
+DISPLAY_COLUMNS = {
+    "so_van_ban": "Số văn bản",
+    "tieu_de": "Tiêu đề",
+    "co_quan": "Cơ quan",
+    "linh_vuc": "Lĩnh vực",
+    "ngay_ban_hanh": "NgayBH",
+    "file_dinh_kem": "File Dropbox",
+}
+
+
+@st.cache_resource(show_spinner=False)
+def _init_store() -> None:
+    """Tạo CSDL + nhập vanban.csv cũ (chỉ chạy 1 lần cho mỗi tiến trình)."""
+    database.init_db()
+    database.import_csv(DATA_FILE)
+    export_engine.sweep()  # file xuất còn sót từ lần chạy trước
+
+
+_init_store()
+
+
+@st.cache_resource(show_spinner=False)
+def _compactor() -> Compactor:
+    """Thread nền dọn văn bản đã xóa (file Dropbox + dòng CSDL), 1 thread/tiến trình."""
+    worker = Compactor(functools.partial(get_storage().delete, missing_ok=True))
+    worker.start()
+    return worker
+
+
+_compactor()
+
+
+@st.cache_resource(show_spinner=False)
+def _text_indexer() -> TextIndexer:
+    """Thread nền trích nội dung PDF/DOCX vào chỉ mục tìm kiếm (tiến trình con), 1 thread/tiến trình."""
+    worker = TextIndexer(get_storage().download)
+    worker.start()
+    return worker
+
+
+_text_indexer()
+
 
 # =========================
-# Helpers
+# Cache dữ liệu theo phiên bản sổ văn bản
 # =========================
-def _clean_path(val: str) -> str:
-    if not isinstance(val, str):
-        return ""
-    return val.replace("✅ Đã upload thành công tới:", "").strip()
-
-def _norm(s: str) -> str:
-    s = "" if s is None else str(s)
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-    return s.lower().strip()
-
-def _format_ddmmyyyy(dt) -> str:
-    """Nhận Timestamp/str/date -> trả về dd/mm/yyyy hoặc chuỗi gốc."""
-    if pd.isna(dt):
-        return ""
-    try:
-        return pd.to_datetime(dt, errors="coerce").strftime("%d/%m/%Y")
-    except Exception:
-        return str(dt)
+# Mọi lần thêm/sửa/xóa đều tăng registry_version (trigger trong SQLite), nên
+# cache chỉ mất hiệu lực khi dữ liệu thật sự đổi; đổi bộ lọc/trang mà dữ liệu
+# không đổi thì lấy lại từ cache, không chạy truy vấn.
+@st.cache_data(show_spinner=False, max_entries=8)
+def _facets(version: int) -> dict:
+    """Danh sách Cơ quan / Lĩnh vực + khoảng ngày ban hành."""
+    return {
+        "co_quan": database.distinct_values("co_quan"),
+        "linh_vuc": database.distinct_values("linh_vuc"),
+        "date_bounds": database.date_bounds(),
+        "has_rows": database.has_vanban(),
+        "content": database.content_stats(),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _query_page(version: int, flt: database.VanbanFilter, offset: int, limit: int | None):
+    rows, total = database.query_vanban(flt, offset=offset, limit=limit)
+    return [dict(r) for r in rows], total
 
-def _export_table_bytes(df: pd.DataFrame):
-    """Xuất Excel (ưu tiên openpyxl -> xlsxwriter -> CSV)."""
-    # 1) openpyxl
-    try:
-        buf = io.BytesIO()
-        with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="DanhSach")
-        buf.seek(0)
-        return (
-            buf.read(),
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            "vanban_loc.xlsx",
-        )
-    except Exception:
-        pass
-    # 2) xlsxwriter
+# =========================
+# Helpers
+# =========================
+@metrics.timed("ui.rows_to_df")
+def _rows_to_df(rows):
+    """Các dòng SQLite -> DataFrame với tên cột hiển thị + "Ngày ban hành" dd/mm/yyyy."""
+    import pandas as pd
+
+    df = pd.DataFrame(
+        [dict(r) for r in rows], columns=["id", *DISPLAY_COLUMNS, "file_missing"]
+    ).rename(columns=DISPLAY_COLUMNS)
+    df = df.fillna("")
+    df["Ngày ban hành"] = pd.to_datetime(df["NgayBH"], errors="coerce").dt.strftime("%d/%m/%Y").fillna("")
+    return df
+
+# Định dạng xuất (export_engine.FORMATS) + "zip": file đính kèm kèm bảng danh sách
+EXPORT_LABELS = {
+    "xlsx": "Excel (.xlsx)",
+    "csv": "CSV",
+    "parquet": "Parquet",
+    "zip": "File đính kèm (.zip)",
+}
+
+
+def _discard_export(job) -> None:
+    """Xóa file tạm của 1 lần xuất (gọi khi job xong)."""
+    if not job.cancelled() and job.exception() is None:
+        path = job.result()[0]
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _start_export(flt: database.VanbanFilter, fmt: str) -> None:
+    """Tạo file xuất ở thread nền (đọc SQLite theo lô), bỏ file xuất cũ của phiên."""
+    old = st.session_state.pop("export_job", None)
+    if old is not None and not old.cancel():
+        old.add_done_callback(_discard_export)
+    if fmt == "zip":
+        # Tải file song song (dùng lại bản trong blob_cache) rồi ghi thẳng vào ZIP
+        job, progress = export_engine.submit_attachments(flt, get_storage().download)
+        st.session_state["export_progress"] = progress
+    else:
+        job = export_engine.submit_export(flt, fmt)
+        st.session_state.pop("export_progress", None)
+    st.session_state["export_job"] = job
+
+
+def _export_status() -> None:
+    """Trạng thái file xuất; fragment tự chạy lại mỗi giây tới khi xong."""
+    job = st.session_state.get("export_job")
+    if job is None:
+        return
+    progress = st.session_state.get("export_progress")
+    if not job.done():
+        if progress and progress.get("total"):
+            st.progress(
+                progress["done"] / progress["total"],
+                text=f"⏳ Đang tải file đính kèm {progress['done']}/{progress['total']}…",
+            )
+        else:
+            st.info("⏳ Đang tạo file xuất… (vẫn dùng được các chức năng khác)")
+        st.session_state["export_pending"] = True
+        return
+    if st.session_state.pop("export_pending", False):
+        st.rerun()  # xong -> chạy lại cả trang để ngừng tự làm mới
     try:
-        buf = io.BytesIO()
-        with pd.ExcelWriter(buf, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="DanhSach")
-            ws = writer.sheets["DanhSach"]
-            for i, col in enumerate(df.columns):
-                width = min(40, max(12, int(df[col].astype(str).map(len).max() * 1.1)))
-                ws.set_column(i, i, width)
-        buf.seek(0)
-        return (
-            buf.read(),
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            "vanban_loc.xlsx",
-        )
-    except Exception:
-        csv_bytes = df.to_csv(index=False).encode("utf-8-sig")
-        return csv_bytes, "text/csv", "vanban_loc.csv"
+        path, mime, fname = job.result()
+    except Exception as e:
+        st.session_state.pop("export_job", None)
+        st.error(f"❌ Xuất file lỗi: {e}")
+        return
+    if not os.path.exists(path):
+        # Quá EXPORT_TTL -> đã bị dọn
+        st.session_state.pop("export_job", None)
+        st.info("File xuất đã hết hạn, hãy bấm Xuất file lại.")
+        return
+    if progress and progress.get("errors"):
+        st.warning(f"⚠️ {progress['errors']} file không tải được (xem loi_tai_file.txt trong file ZIP).")
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    st.download_button(
+        "⬇️ Tải dữ liệu đã lọc",
+        data=functools.partial(export_engine.read_export, path),
+        help=f"{size_mb:.1f} MB (tối đa {export_engine.EXPORT_MAX_MB} MB)",
+        file_name=fname,
+        mime=mime,
+        on_click="ignore",
+    )
 
 # =========================
 # Form nhập liệu + upload
@@ -115,84 +218,120 @@ with st.form("form_vanban", clear_on_submit=False):
     submitted = st.form_submit_button("💾 Lưu văn bản", type="primary")
 
     if submitted:
-        dropbox_path = None
+        dropbox_path = file_hash = None
         if file_upload:
-            suffix = os.path.splitext(file_upload.name)[1]
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                tmp.write(file_upload.read())
-                tmp_path = tmp.name
+            # Upload thẳng từ buffer của UploadedFile (không ghi file tạm);
+            # file trùng nội dung với file đã lưu thì dùng lại, không upload lại
             try:
-                dropbox_path = upload_file_to_dropbox(tmp_path, file_upload.name)
-                st.toast("✅ Upload thành công!", icon="✅")
+                dropbox_path, file_hash, reused = get_storage().store(file_upload, file_upload.name)
+                if reused:
+                    st.toast(f"♻️ File đã có sẵn ({os.path.basename(dropbox_path)}), không upload lại.", icon="♻️")
+                else:
+                    st.toast("✅ Upload thành công!", icon="✅")
             except Exception as e:
                 st.error(f"Lỗi upload: {e}")
-            finally:
-                os.remove(tmp_path)
-
-        # Lưu **cả hai cột**:
-        # - NgayBH (ISO, dùng để lọc & tính toán)
-        # - Ngày ban hành (dd/mm/yyyy) để hiển thị/Excel
-        ngay_bh_iso = ngay_bh.isoformat()
-        ngay_bh_vn  = ngay_bh.strftime("%d/%m/%Y")
 
         row = {
-            "Số văn bản": so_van_ban,
-            "Tiêu đề": tieu_de,
-            "Cơ quan": co_quan,
-            "Lĩnh vực": linh_vuc,
-            "NgayBH": ngay_bh_iso,
-            "Ngày ban hành": ngay_bh_vn,
-            "File Dropbox": dropbox_path if dropbox_path else "Không có",
+            "so_van_ban": so_van_ban,
+            "tieu_de": tieu_de,
+            "co_quan": co_quan,
+            "linh_vuc": linh_vuc,
+            "ngay_ban_hanh": ngay_bh.isoformat(),  # ISO, dùng để lọc & sắp xếp
+            "file_dinh_kem": dropbox_path,
+            "content_hash": file_hash,
         }
-
-        if not os.path.exists(DATA_FILE):
-            pd.DataFrame([row]).to_csv(DATA_FILE, index=False, encoding="utf-8-sig")
-        else:
-            pd.DataFrame([row]).to_csv(DATA_FILE, mode="a", header=False, index=False, encoding="utf-8-sig")
+        database.insert_vanban(row)
 
         if dropbox_path:
+            _text_indexer().wake()  # trích nội dung file ở nền để tìm kiếm
             st.success("Văn bản đã được lưu.")
         else:
             st.warning("Đã lưu thông tin, nhưng chưa có file Dropbox.")
 
-st.subheader("🗂️ Danh sách Văn bản đã lưu")
+# =========================
+# Nhập hàng loạt (nhiều file / ZIP + bảng metadata)
+# =========================
+with st.expander("📦 Nhập hàng loạt"):
+    with st.form("form_bulk", clear_on_submit=True):
+        bulk_files = st.file_uploader(
+            "File đính kèm (PDF/DOCX hoặc ZIP)", type=["pdf", "docx", "zip"], accept_multiple_files=True
+        )
+        bulk_meta = st.file_uploader(
+            "Bảng metadata (tuỳ chọn, XLSX/CSV): cột Tên file, Số văn bản, Tiêu đề, Cơ quan, Lĩnh vực, Ngày ban hành",
+            type=["xlsx", "csv"],
+        )
+        b1, b2, b3 = st.columns(3)
+        bulk_coquan  = b1.text_input("Cơ quan (mặc định)")
+        bulk_linhvuc = b2.text_input("Lĩnh vực (mặc định)")
+        bulk_ngay    = b3.date_input("Ngày ban hành (mặc định)", value=date.today(), format="DD/MM/YYYY")
+        bulk_submit  = st.form_submit_button("📥 Nhập hàng loạt", type="primary")
+
+    if bulk_submit and bulk_files:
+        records = []
+        if bulk_meta is not None:
+            import pandas as pd
+
+            if bulk_meta.name.lower().endswith(".csv"):
+                meta_df = pd.read_csv(bulk_meta, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+            else:
+                meta_df = pd.read_excel(bulk_meta, dtype=str).fillna("")
+            records = meta_df.to_dict("records")
+        items = bulk_ingest.items_from_uploads(bulk_files, bulk_ingest.metadata_by_file(records))
+
+        progress = st.progress(0.0, text="Đang upload...")
+        def _on_progress(done, total, name, err):
+            mark = "✅" if err is None else "❌"
+            progress.progress(done / total, text=f"{mark} {done}/{total}: {name}")
+
+        saved, errors = bulk_ingest.ingest(
+            items,
+            get_storage().store,
+            defaults={
+                "co_quan": bulk_coquan,
+                "linh_vuc": bulk_linhvuc,
+                "ngay_ban_hanh": bulk_ngay.isoformat(),
+            },
+            on_progress=_on_progress,
+        )
+        if saved:
+            _text_indexer().wake()
+        st.success(f"Đã lưu {saved}/{len(items)} văn bản.")
+        for name, err in errors.items():
+            st.error(f"Lỗi upload {name}: {err}")
+
+h1, h2 = st.columns([5, 1])
+h1.subheader("🗂️ Danh sách Văn bản đã lưu")
+if h2.button("🔄 Đồng bộ Dropbox", help="Cập nhật thay đổi trong thư mục Dropbox kể từ lần đồng bộ trước"):
+    try:
+        res = get_storage().sync()
+        _text_indexer().wake()  # file mới / đã sửa trên Dropbox
+        st.toast(
+            f"Đồng bộ xong: {res['changes']} thay đổi, {res['relinked']} file đổi tên, "
+            f"{res['missing']} văn bản thiếu file.",
+            icon="🔄",
+        )
+    except Exception as e:
+        st.error(f"Lỗi đồng bộ Dropbox: {e}")
 
 # =========================
 # Đọc dữ liệu & tìm kiếm / lọc
 # =========================
-if os.path.exists(DATA_FILE):
-    df = pd.read_csv(DATA_FILE, keep_default_na=False)
-
-    # Chuẩn hóa cột file
-    if "File Dropbox" in df.columns:
-        df["File Dropbox"] = df["File Dropbox"].apply(_clean_path)
-
-    # Chuẩn hóa cột ngày:
-    # - NgayBH là ISO (YYYY-MM-DD); nếu thiếu, sinh từ "Ngày ban hành" (VN)
-    if "NgayBH" not in df.columns:
-        # fallback nếu các bản cũ chưa có cột NgayBH
-        df["NgayBH"] = pd.to_datetime(
-            df.get("Ngày ban hành", ""), errors="coerce", dayfirst=True
-        ).dt.strftime("%Y-%m-%d").fillna("")
-    # Series datetime để lọc
-    NgayBH_dt = pd.to_datetime(df["NgayBH"], errors="coerce")
-
+registry_version = database.registry_version()
+with metrics.span("ui.facets"):
+    facets = _facets(registry_version)
+if facets["has_rows"]:
     with st.expander("🔎 Tìm kiếm & bộ lọc", expanded=True):
-        q = st.text_input("Từ khóa", placeholder="Nhập số văn bản, tiêu đề, cơ quan, lĩnh vực, tên file...")
+        q = st.text_input("Từ khóa", placeholder="Nhập số văn bản, tiêu đề, cơ quan, lĩnh vực, tên file, nội dung file...")
 
         c1, c2, c3, c4, c5, c6 = st.columns([1, 1, 1, 1.2, 0.9, 1.1])
-        sel_coquan  = c1.multiselect("Cơ quan", sorted([x for x in df.get("Cơ quan", "").unique() if str(x).strip()]))
-        sel_linhvuc = c2.multiselect("Lĩnh vực", sorted([x for x in df.get("Lĩnh vực", "").unique() if str(x).strip()]))
+        sel_coquan  = c1.multiselect("Cơ quan", facets["co_quan"])
+        sel_linhvuc = c2.multiselect("Lĩnh vực", facets["linh_vuc"])
         sel_ext     = c3.multiselect("Định dạng file", ["pdf", "docx"])
 
-        # min/max ngày có thực (dựa trên NgayBH_dt)
-        dt_series = NgayBH_dt.dropna()
-        if len(dt_series) == 0:
-            dt_min = date.today()
-            dt_max = date.today()
-        else:
-            dt_min = dt_series.min().date()
-            dt_max = dt_series.max().date()
+        # min/max ngày có thực (MIN/MAX trên index ngay_ban_hanh)
+        iso_min, iso_max = facets["date_bounds"]
+        dt_min = date.fromisoformat(iso_min) if iso_min else date.today()
+        dt_max = date.fromisoformat(iso_max) if iso_max else date.today()
 
         # Bộ lọc khoảng ngày ban hành (hiển thị VN)
         date_from, date_to = c4.date_input(
@@ -201,139 +340,110 @@ if os.path.exists(DATA_FILE):
             format="DD/MM/YYYY"
         )
         page_size   = c5.selectbox("Mỗi trang", [10, 20, 50, 100], index=0)
-        export_btn  = c6.button("⬇️ Xuất Excel/CSV (kết quả lọc)")
-
-    # Cột chuẩn hóa tìm kiếm (gộp các trường; dùng NgayBH ISO cho ổn)
-    cols_join = [
-        df.get("Số văn bản", "").astype(str),
-        df.get("Tiêu đề", "").astype(str),
-        df.get("Cơ quan", "").astype(str),
-        df.get("Lĩnh vực", "").astype(str),
-        df.get("File Dropbox", "").astype(str),
-        NgayBH_dt.dt.strftime("%Y-%m-%d").fillna(""),  # chuẩn tìm kiếm
-    ]
-    df["_norm_row"] = (
-        cols_join[0] + " " + cols_join[1] + " " + cols_join[2] + " " +
-        cols_join[3] + " " + cols_join[4] + " " + cols_join[5]
-    ).map(_norm)
-
-    # Lọc theo từ khóa/các field
-    filtered = df.copy()
-    if q:
-        nq = _norm(q)
-        filtered = filtered[filtered["_norm_row"].str.contains(nq, na=False)]
-    if sel_coquan:
-        filtered = filtered[filtered.get("Cơ quan", "").isin(sel_coquan)]
-    if sel_linhvuc:
-        filtered = filtered[filtered.get("Lĩnh vực", "").isin(sel_linhvuc)]
-    if sel_ext:
-        filtered = filtered[filtered["File Dropbox"].str.lower().str.endswith(tuple(sel_ext))]
-
-    # Lọc theo khoảng ngày ban hành (dựa vào NgayBH_dt)
-    if isinstance(date_from, date) and isinstance(date_to, date):
-        series_date = pd.to_datetime(filtered["NgayBH"], errors="coerce").dt.date
-        mask_date = (series_date >= date_from) & (series_date <= date_to)
-        filtered = filtered[mask_date]
-
-    if "_norm_row" in filtered.columns:
-        filtered = filtered.drop(columns=["_norm_row"])
-
-    # Xuất Excel/CSV (đảm bảo cột hiển thị là dd/mm/yyyy)
+        export_fmt  = c6.selectbox("Xuất kết quả lọc", list(EXPORT_LABELS), format_func=EXPORT_LABELS.get)
+        export_btn  = c6.button("⬇️ Xuất file")
+
+    # Bộ lọc được dịch thành 1 truy vấn SQLite (FTS + index), chỉ lấy đúng 1 trang
+    date_range = isinstance(date_from, date) and isinstance(date_to, date)
+    flt = database.VanbanFilter(
+        keyword=q,
+        co_quan=sel_coquan,
+        linh_vuc=sel_linhvuc,
+        extensions=sel_ext,
+        date_from=date_from if date_range else None,
+        date_to=date_to if date_range else None,
+    )
+
+    # Xuất file: ghi theo lô ra file tạm ở thread nền, giao diện không phải chờ
     if export_btn:
-        tmp = filtered.copy()
-        # Chuẩn 'Ngày ban hành' cho đẹp
-        if "Ngày ban hành" in tmp.columns:
-            tmp["Ngày ban hành"] = tmp["Ngày ban hành"].apply(_format_ddmmyyyy)
-        else:
-            # nếu chưa có thì sinh từ NgayBH
-            tmp["Ngày ban hành"] = pd.to_datetime(tmp["NgayBH"], errors="coerce").dt.strftime("%d/%m/%Y")
-        data_bytes, mime, fname = _export_table_bytes(tmp.drop(columns=["NgayBH"], errors="ignore"))
-        st.download_button("⬇️ Tải dữ liệu đã lọc", data=data_bytes, file_name=fname, mime=mime)
+        _start_export(flt, export_fmt)
+    _job = st.session_state.get("export_job")
+    st.fragment(_export_status, run_every=1 if _job is not None and not _job.done() else None)()
 
     # =========================
     # Phân trang + hiển thị
     # =========================
-    total = len(filtered)
+    page = st.session_state.get("page", 1)
+    with metrics.span("ui.query_page"):
+        page_rows, total = _query_page(registry_version, flt, (page - 1) * page_size, page_size)
+        pages = max((total + page_size - 1) // page_size, 1)
+        if page > pages:
+            # Bộ lọc mới có ít trang hơn -> về trang cuối
+            page = st.session_state["page"] = pages
+            page_rows, total = _query_page(registry_version, flt, (page - 1) * page_size, page_size)
+
     if total == 0:
         st.info("Không có dữ liệu phù hợp.")
     else:
-        pages = (total + page_size - 1) // page_size
         pg_col1, pg_col2 = st.columns([1, 6])
-        page = pg_col1.number_input("Trang", min_value=1, max_value=max(pages, 1), value=1, step=1)
+        page = pg_col1.number_input("Trang", min_value=1, max_value=pages, value=1, step=1, key="page")
         pg_col2.markdown(f"<span class='badge'>Tổng: {total} dòng • {pages} trang</span>", unsafe_allow_html=True)
 
         start = (page - 1) * page_size
-        end   = start + page_size
-        show  = filtered.iloc[start:end].reset_index(drop=True)
-
-        # Hiển thị ngày kiểu VN
-        show_disp = show.copy()
-        if "Ngày ban hành" in show_disp.columns and show_disp["Ngày ban hành"].notna().any():
-            show_disp["Ngày ban hành"] = show_disp["Ngày ban hành"].apply(_format_ddmmyyyy)
-        else:
-            show_disp["Ngày ban hành"] = pd.to_datetime(show_disp["NgayBH"], errors="coerce").dt.strftime("%d/%m/%Y")
-
-        # Header
-        H = st.columns([0.35, 0.9, 1.8, 1.1, 1.1, 1.1, 1.6, 0.7, 0.7])
-        H[0].markdown("**#**")
-        H[1].markdown("**Số văn bản**")
-        H[2].markdown("**Tiêu đề**")
-        H[3].markdown("**Cơ quan**")
-        H[4].markdown("**Lĩnh vực**")
-        H[5].markdown("**Ngày BH**")
-        H[6].markdown("**File**")
-        H[7].markdown("**⬇️ Tải**")
-        H[8].markdown("**🗑 Xóa**")
-
-        # Render từng hàng
-        for idx, row in show_disp.iterrows():
-            dropbox_path = _clean_path(row.get("File Dropbox", ""))
+        show_disp = _rows_to_df(page_rows)
+
+        # 1 bảng duy nhất (st.dataframe) thay cho từng hàng st.columns + nút;
+        # chọn 1 dòng -> hiện thanh thao tác Tải / Xóa cho dòng đó.
+        table = show_disp[["Số văn bản", "Tiêu đề", "Cơ quan", "Lĩnh vực", "Ngày ban hành"]].copy()
+        table.insert(0, "#", range(start + 1, start + 1 + len(show_disp)))
+        table["File"] = [
+            ("⚠️ " if missing else "") + os.path.basename(p) if p.startswith("/") else "-"
+            for p, missing in zip(show_disp["File Dropbox"], show_disp["file_missing"])
+        ]
+        with metrics.span("ui.table"):
+            event = st.dataframe(
+                table,
+                hide_index=True,
+                width="stretch",
+                on_select="rerun",
+                selection_mode="single-row",
+                # Đổi trang/bộ lọc -> bảng mới, bỏ chọn dòng cũ
+                key=f"tbl_{hash(tuple(show_disp['id']))}",
+            )
+
+        if event.selection.rows:
+            row = show_disp.iloc[event.selection.rows[0]]
+            dropbox_path = row.get("File Dropbox", "")
             file_name = os.path.basename(dropbox_path) if dropbox_path.startswith("/") else ""
 
-            c = st.columns([0.35, 0.9, 1.8, 1.1, 1.1, 1.1, 1.6, 0.7, 0.7])
-            c[0].write(f"**{start + idx + 1}**")
-            c[1].write(row.get("Số văn bản", ""))
-            c[2].write(row.get("Tiêu đề", ""))
-            c[3].write(row.get("Cơ quan", ""))
-            c[4].write(row.get("Lĩnh vực", ""))
-            c[5].write(row.get("Ngày ban hành", ""))  # dd/mm/yyyy
-            c[6].write(os.path.basename(dropbox_path) or "-")
-
-            if dropbox_path and dropbox_path.startswith("/"):
-                # ⬇️ Tải
-                with c[7].container():
-                    st.markdown('<div class="btn-cell">', unsafe_allow_html=True)
-                    try:
-                        file_bytes = download_bytes_from_dropbox(dropbox_path)
-                        st.download_button(
-                            "⬇️",
-                            data=file_bytes,
-                            file_name=file_name or "file",
-                            mime="application/octet-stream",
-                            key=f"dl_{start}_{idx}",
-                        )
-                    except Exception:
-                        st.button("⚠️", key=f"warn_{start}_{idx}", disabled=True)
-                    st.markdown("</div>", unsafe_allow_html=True)
-
-                # 🗑 Xóa
-                with c[8].container():
-                    st.markdown('<div class="btn-cell">', unsafe_allow_html=True)
-                    if st.button("🗑", key=f"del_{start}_{idx}"):
-                        try:
-                            delete_file_from_dropbox(dropbox_path)
-                        except Exception as e:
-                            st.error(f"Lỗi xóa Dropbox: {e}")
-
-                        full_df = pd.read_csv(DATA_FILE, keep_default_na=False)
-                        full_df["File Dropbox"] = full_df["File Dropbox"].apply(_clean_path)
-                        full_df = full_df[full_df["File Dropbox"] != dropbox_path]
-                        full_df.to_csv(DATA_FILE, index=False, encoding="utf-8-sig")
-                        st.success(f"Đã xóa: {file_name}")
-                        st.rerun()
-                    st.markdown("</div>", unsafe_allow_html=True)
+            a1, a2, a3 = st.columns([0.7, 0.7, 6])
+            a3.markdown(f"**{row['Số văn bản'] or '-'}** — {row['Tiêu đề']}")
+            if file_name and row["file_missing"]:
+                a1.button("⚠️", key=f"dl_{row['id']}", disabled=True, help="File không còn trên Dropbox")
+            elif file_name:
+                # ⬇️ Tải: chỉ tải nội dung từ Dropbox khi người dùng bấm nút
+                # (callable chạy lúc click), render trang không gọi Dropbox.
+                a1.download_button(
+                    "⬇️ Tải",
+                    data=functools.partial(get_storage().download_bytes, dropbox_path),
+                    file_name=file_name,
+                    mime="application/octet-stream",
+                    on_click="ignore",
+                    key=f"dl_{row['id']}",
+                )
             else:
-                c[7].write("-")
-                c[8].write("-")
+                a1.button("⬇️ Tải", key=f"dl_{row['id']}", disabled=True, help="Không có file đính kèm")
+
+            # 🗑 Xóa
+            if a2.button("🗑 Xóa", key=f"del_{row['id']}"):
+                # Xóa mềm theo id (tức thì); file Dropbox được xóa ở thread nền
+                database.delete_vanban(int(row["id"]))
+                _compactor().wake()
+                st.success(f"Đã xóa: {file_name or row['Số văn bản']}")
+                st.rerun()
 else:
     st.info("Chưa có văn bản nào được lưu.")
+
+_cache = blob_cache.stats()
+st.caption(
+    f"📦 Cache file đính kèm: {_cache['hits']} hit • {_cache['misses']} miss • "
+    f"{_cache['files']} file ({_cache['bytes'] / 1024 / 1024:.1f} MB)"
+)
+_content = facets["content"]
+if _content["files"]:
+    st.caption(
+        f"📝 Tìm theo nội dung file: {_content['indexed']}/{_content['files']} văn bản đã lập chỉ mục"
+        + (f" • {_content['failed']} file không trích được" if _content["failed"] else "")
+    )
+
+admin_panel.end_run("quanlyvanban", _run)
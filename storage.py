@@ -0,0 +1,226 @@
+# storage.py
+"""
+Nơi lưu file đính kèm, chọn lúc chạy qua STORAGE_BACKEND (env hoặc secrets):
+- "dropbox" (mặc định): upload_to_dropbox + dropbox_sync
+- "local": thư mục trên máy (LOCAL_STORAGE_DIR), dùng khi chạy thử / không có mạng
+
+SDK của từng backend chỉ được import khi gọi tới lần đầu, nên mở app
+không phải trả chi phí import dropbox / requests.
+
+Storage.store: upload có khử trùng lặp theo nội dung (content_hash kiểu Dropbox).
+"""
+import io
+import os
+import shutil
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+
+import blob_cache
+import database
+import metrics
+from common import setting, unique_name
+
+DEFAULT_BACKEND = "dropbox"
+# Thư mục gốc của backend "local" (đường dẫn "/a/b.pdf" -> LOCAL_STORAGE_DIR/a/b.pdf)
+LOCAL_STORAGE_DIR = os.environ.get("LOCAL_STORAGE_DIR", ".storage")
+
+# content_hash của Dropbox: sha256 từng khối 4MB, rồi sha256 của chuỗi các hash khối
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+_STORAGE = None
+_STORAGE_LOCK = threading.Lock()
+
+
+def content_hash(source) -> str:
+    """
+    content_hash (thuật toán của Dropbox) của nguồn upload: đường dẫn, bytes
+    hoặc file-like có seek. Đọc từng khối HASH_BLOCK_SIZE, không nạp cả file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return content_hash(f)
+    blocks = []
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        mv = memoryview(source).cast("B")
+        for i in range(0, len(mv), HASH_BLOCK_SIZE):
+            blocks.append(hashlib.sha256(mv[i:i + HASH_BLOCK_SIZE]).digest())
+    else:
+        source.seek(0)
+        while chunk := source.read(HASH_BLOCK_SIZE):
+            blocks.append(hashlib.sha256(chunk).digest())
+        source.seek(0)
+    return hashlib.sha256(b"".join(blocks)).hexdigest()
+
+
+class Storage(ABC):
+    """Giao diện chung của các backend lưu file (đường dẫn dạng "/thư mục/tên file")."""
+
+    name = ""
+    default_folder = "/"
+
+    @abstractmethod
+    def upload(self, source, file_name: str, folder: str | None = None) -> str:
+        """
+        source: đường dẫn, bytes hoặc file-like. Không ghi đè file khác trùng tên
+        (tự đổi tên "a (1).pdf"). Trả về đường dẫn đã lưu.
+        """
+
+    def store(self, source, file_name: str, folder: str | None = None, db_path: str | None = None) -> tuple[str, str, bool]:
+        """
+        Upload có khử trùng lặp: tính content_hash, nếu sổ văn bản đã có văn bản
+        (chưa xóa, còn file) dùng file cùng nội dung thì dùng lại đường dẫn đó,
+        không upload lại. Chỉ tra trong CSDL: file chỉ được dùng lại khi còn văn bản
+        trỏ tới, nên compact() không xóa nó (xem database.compact).
+        Trả về (đường dẫn, content_hash, True nếu dùng lại file có sẵn).
+        """
+        with metrics.span("storage.hash"):
+            digest = content_hash(source)
+        path = database.find_file_by_hash(digest, db_path=db_path)
+        if path is not None:
+            metrics.count("dedup_hits", service=self.name)
+            return path, digest, True
+        return self.upload(source, file_name, folder), digest, False
+
+    @abstractmethod
+    def download(self, path: str) -> str:
+        """Trả về đường dẫn file cục bộ (có thể là bản trong cache) để đọc."""
+
+    def download_bytes(self, path: str) -> bytes:
+        return blob_cache.read_bytes(self.download(path))
+
+    @abstractmethod
+    def delete(self, path: str, missing_ok: bool = False) -> None:
+        """Xóa file; missing_ok=True thì bỏ qua file đã không còn."""
+
+    @abstractmethod
+    def sync(self, folder: str | None = None, db_path: str | None = None) -> dict:
+        """Đối chiếu sổ văn bản với thư mục lưu trữ (xem database.apply_file_changes)."""
+
+
+class DropboxStorage(Storage):
+    name = "dropbox"
+    # None -> thư mục mặc định của upload_to_dropbox (DEFAULT_FOLDER)
+    default_folder = None
+
+    def upload(self, source, file_name: str, folder: str | None = None) -> str:
+        from upload_to_dropbox import upload_file_to_dropbox
+        return upload_file_to_dropbox(source, file_name, folder or self.default_folder)
+
+    def download(self, path: str) -> str:
+        from upload_to_dropbox import download_file_from_dropbox
+        return download_file_from_dropbox(path)
+
+    def download_bytes(self, path: str) -> bytes:
+        from upload_to_dropbox import download_bytes_from_dropbox
+        return download_bytes_from_dropbox(path)
+
+    def delete(self, path: str, missing_ok: bool = False) -> None:
+        from upload_to_dropbox import delete_file_from_dropbox
+        delete_file_from_dropbox(path, missing_ok=missing_ok)
+
+    def sync(self, folder: str | None = None, db_path: str | None = None) -> dict:
+        import dropbox_sync
+        folder = folder or self.default_folder
+        if folder is None:
+            return dropbox_sync.sync_folder(db_path=db_path)
+        return dropbox_sync.sync_folder(folder, db_path=db_path)
+
+
+class LocalStorage(Storage):
+    name = "local"
+    default_folder = "/van_ban"
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR):
+        self.root = os.path.abspath(root)
+
+    def _local(self, path: str) -> str:
+        local = os.path.abspath(os.path.join(self.root, path.lstrip("/")))
+        if os.path.commonpath([local, self.root]) != self.root:
+            raise ValueError(f"Đường dẫn không hợp lệ: {path}")
+        return local
+
+    def upload(self, source, file_name: str, folder: str | None = None) -> str:
+        folder = (folder or self.default_folder).strip("/")
+        local_dir = self._local("/" + folder)
+        os.makedirs(local_dir, exist_ok=True)
+        tmp = os.path.join(local_dir, f".{file_name}.{threading.get_ident()}.part")
+        if isinstance(source, (str, os.PathLike)):
+            shutil.copyfile(source, tmp)
+        else:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                source = io.BytesIO(source)
+            source.seek(0)
+            with open(tmp, "wb") as out:
+                shutil.copyfileobj(source, out, 1024 * 1024)
+        try:
+            n = 0
+            while True:
+                name = unique_name(file_name, n)
+                path = "/" + "/".join(p for p in (folder, name) if p)
+                try:
+                    # link: tạo tên mới, báo lỗi nếu tên đã có (không ghi đè)
+                    os.link(tmp, self._local(path))
+                    return path
+                except FileExistsError:
+                    n += 1
+        finally:
+            os.remove(tmp)
+
+    def download(self, path: str) -> str:
+        local = self._local(path)
+        if not os.path.isfile(local):
+            raise FileNotFoundError(path)
+        return local
+
+    def delete(self, path: str, missing_ok: bool = False) -> None:
+        try:
+            os.remove(self._local(path))
+        except FileNotFoundError:
+            if not missing_ok:
+                raise
+
+    def sync(self, folder: str | None = None, db_path: str | None = None) -> dict:
+        """Liệt kê lại toàn bộ thư mục (không có cursor như Dropbox)."""
+        folder = "/" + (folder or self.default_folder).strip("/")
+        files = []
+        for dirpath, _, names in os.walk(self._local(folder)):
+            for n in names:
+                local = os.path.join(dirpath, n)
+                path = "/" + os.path.relpath(local, self.root).replace(os.sep, "/")
+                if n.endswith(".part"):
+                    continue
+                stat = os.stat(local)
+                files.append({
+                    "path_lower": path.lower(),
+                    "path_display": path,
+                    "size": stat.st_size,
+                    "rev": str(stat.st_mtime_ns),
+                    # Đọc lại cả file mỗi lần đồng bộ (backend chạy thử, thư mục nhỏ)
+                    "content_hash": content_hash(local),
+                })
+        stats = database.apply_file_changes(files, [], folder_key=folder.lower(), db_path=db_path)
+        return {**stats, "changes": len(files), "full": True}
+
+
+_BACKENDS = {"dropbox": DropboxStorage, "local": LocalStorage}
+
+
+def get_storage() -> Storage:
+    """Backend dùng chung cả tiến trình, theo STORAGE_BACKEND."""
+    global _STORAGE
+    if _STORAGE is None:
+        with _STORAGE_LOCK:
+            if _STORAGE is None:
+                name = str(setting("STORAGE_BACKEND", DEFAULT_BACKEND)).strip().lower()
+                if name not in _BACKENDS:
+                    raise ValueError(f"STORAGE_BACKEND không hỗ trợ: {name} (chọn: {', '.join(_BACKENDS)})")
+                _STORAGE = _BACKENDS[name]()
+    return _STORAGE
+
+
+def set_storage(backend: Storage | None) -> None:
+    """Thay backend dùng chung (benchmark / chạy thử với fakes.MemoryStorage); None = chọn lại theo cấu hình."""
+    global _STORAGE
+    with _STORAGE_LOCK:
+        _STORAGE = backend
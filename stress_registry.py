@@ -0,0 +1,140 @@
+# stress_registry.py
+"""
+Kiểm tra ghi đồng thời vào sổ văn bản (SQLite): nhiều tiến trình x nhiều thread
+cùng thêm / xóa văn bản, sau đó đối chiếu để chắc chắn không mất dòng nào.
+
+Chạy:  python stress_registry.py --procs 4 --threads 4 --ops 200
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+
+def _thread_worker(db_path: str, worker: str, ops: int, seed: int) -> tuple[list[int], list[int]]:
+    """Thêm/xóa ngẫu nhiên; trả về (id đã thêm, id đã xóa) của riêng thread này."""
+    rnd = random.Random(seed)
+    inserted, deleted = [], []
+    for n in range(ops):
+        if inserted and rnd.random() < 0.3:
+            vid = inserted.pop(rnd.randrange(len(inserted)))
+            if database.delete_vanban(vid, db_path=db_path):
+                deleted.append(vid)
+        elif rnd.random() < 0.1:
+            rows = [
+                {"so_van_ban": f"{worker}-{n}-{k}", "tieu_de": f"Lô {worker} {n}", "co_quan": "UBND"}
+                for k in range(5)
+            ]
+            database.insert_many(rows, db_path=db_path)
+            # insert_many không trả id -> tra lại theo số văn bản (duy nhất)
+            with database.get_conn(db_path) as conn:
+                inserted.extend(
+                    r[0] for r in conn.execute(
+                        "SELECT id FROM vanban WHERE so_van_ban LIKE ?", (f"{worker}-{n}-%",)
+                    )
+                )
+        else:
+            inserted.append(database.insert_vanban(
+                {
+                    "so_van_ban": f"{worker}-{n}",
+                    "tieu_de": f"Quyết định {worker} {n}",
+                    "co_quan": rnd.choice(["UBND", "Sở Tài chính", "Sở Nội vụ"]),
+                    "ngay_ban_hanh": f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+                    "file_dinh_kem": f"/stress/{worker}-{n}.pdf",
+                },
+                db_path=db_path,
+            ))
+    return inserted, deleted
+
+
+def _process_worker(args) -> tuple[list[int], list[int]]:
+    db_path, proc, threads, ops = args
+    live, deleted = [], []
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [
+            pool.submit(_thread_worker, db_path, f"p{proc}t{t}", ops, proc * 1000 + t)
+            for t in range(threads)
+        ]
+        for fut in futures:
+            ins, dele = fut.result()
+            live.extend(ins)
+            deleted.extend(dele)
+    return live, deleted
+
+
+def run(procs: int, threads: int, ops: int, db_path: str) -> list[str]:
+    """Chạy tải đồng thời, trả về danh sách lỗi phát hiện được (rỗng = đạt)."""
+    database.init_db(db_path)
+    v0 = database.registry_version(db_path)
+
+    with mp.get_context("spawn").Pool(procs) as pool:
+        results = pool.map(_process_worker, [(db_path, p, threads, ops) for p in range(procs)])
+    expected_live = {i for live, _ in results for i in live}
+    expected_deleted = {i for _, dele in results for i in dele}
+
+    # Dọn tombstone song song với 1 lượt thêm nữa (compact vs insert)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        extra = pool.submit(_thread_worker, db_path, "compact", ops, 42)
+        while database.compact(db_path=db_path):
+            pass
+        ins, dele = extra.result()
+    expected_live |= set(ins)
+    expected_deleted |= set(dele)
+    while database.compact(db_path=db_path):
+        pass
+
+    errors = []
+    with database.get_conn(db_path) as conn:
+        actual_live = {r[0] for r in conn.execute("SELECT id FROM vanban WHERE deleted_at IS NULL")}
+        tombstones = conn.execute("SELECT COUNT(*) FROM vanban WHERE deleted_at IS NOT NULL").fetchone()[0]
+        try:
+            conn.execute("INSERT INTO vanban_fts(vanban_fts) VALUES ('integrity-check')")
+        except Exception as e:
+            errors.append(f"FTS không khớp bảng vanban: {e}")
+
+    lost = expected_live - actual_live
+    resurrected = actual_live & expected_deleted
+    unknown = actual_live - expected_live
+    if lost:
+        errors.append(f"Mất {len(lost)} dòng đã thêm: {sorted(lost)[:10]}")
+    if resurrected:
+        errors.append(f"{len(resurrected)} dòng đã xóa vẫn còn: {sorted(resurrected)[:10]}")
+    if unknown:
+        errors.append(f"{len(unknown)} dòng không rõ nguồn gốc: {sorted(unknown)[:10]}")
+    if tombstones:
+        errors.append(f"Còn {tombstones} tombstone sau compact()")
+    if database.registry_version(db_path) <= v0:
+        errors.append("registry_version không tăng")
+
+    print(
+        f"{procs} tiến trình x {threads} thread x {ops} thao tác: "
+        f"{len(actual_live)} dòng còn lại, {len(expected_deleted)} đã xóa"
+    )
+    return errors
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--ops", type=int, default=200, help="số thao tác mỗi thread")
+    ap.add_argument("--db", help="file SQLite (mặc định: file tạm)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "stress.db")
+        errors = run(args.procs, args.threads, args.ops, db_path)
+
+    for e in errors:
+        print("❌", e)
+    print("✅ Không mất dữ liệu." if not errors else "❌ Có lỗi ghi đồng thời.")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
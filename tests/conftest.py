@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Các module của app nằm ở thư mục gốc repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from storage import LocalStorage  # noqa: E402
+
+
+@pytest.fixture
+def env(tmp_path):
+    """(LocalStorage trong thư mục tạm, đường dẫn CSDL tạm đã init_db)."""
+    db = str(tmp_path / "vanban.db")
+    database.init_db(db)
+    return LocalStorage(str(tmp_path / "storage")), db
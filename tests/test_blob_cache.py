@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+import blob_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(blob_cache, "MAX_BYTES", 25)
+    return blob_cache
+
+
+def _put(cache, key, data):
+    tmp = cache.temp_path()
+    with open(tmp, "wb") as f:
+        f.write(data)
+    return cache.put_file(key, tmp)
+
+
+def test_stats_track_puts_without_rescanning(cache, monkeypatch):
+    _put(cache, "aa1", b"x" * 10)
+    monkeypatch.setattr(cache, "_entries", lambda: pytest.fail("stats() không được quét thư mục"))
+    _put(cache, "bb2", b"y" * 10)
+    _put(cache, "bb2", b"y" * 5)
+    s = cache.stats()
+    assert (s["files"], s["bytes"]) == (2, 15)
+
+
+def test_put_over_limit_evicts_oldest(cache):
+    first = _put(cache, "aa1", b"x" * 10)
+    os.utime(first, (1, 1))
+    _put(cache, "bb2", b"y" * 10)
+    _put(cache, "cc3", b"z" * 10)
+    s = cache.stats()
+    assert not os.path.exists(first)
+    assert (s["files"], s["bytes"]) == (2, 20)
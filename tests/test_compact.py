@@ -0,0 +1,25 @@
+import database
+
+
+def test_compact_skips_past_files_that_fail_to_delete(env):
+    store, db = env
+    ids = [
+        database.insert_vanban({"tieu_de": f"VB {i}", "file_dinh_kem": store.upload(f"file {i}".encode(), f"f{i}.pdf")}, db)
+        for i in range(5)
+    ]
+    failing = store.upload(b"x", "khong_xoa_duoc.pdf")
+    # 2 dòng đầu có file xóa lỗi mãi (nhiều hơn/bằng 1 lô)
+    with database.get_conn(db, write=True) as conn:
+        conn.execute("UPDATE vanban SET file_dinh_kem = ? WHERE id IN (?, ?)", (failing, ids[0], ids[1]))
+    for vanban_id in ids:
+        database.delete_vanban(vanban_id, db)
+
+    def delete_file(path):
+        if path == failing:
+            raise OSError("lỗi xóa")
+        store.delete(path)
+
+    assert database.compact(delete_file, batch_size=2, db_path=db) == 3
+    with database.get_conn(db) as conn:
+        left = [r[0] for r in conn.execute("SELECT id FROM vanban ORDER BY id")]
+    assert left == ids[:2]
@@ -0,0 +1,85 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+import requests
+from dropbox import files as dbx_files
+from dropbox.exceptions import ApiError
+
+import upload_to_dropbox
+
+
+class FakeSessionDropbox:
+    """Phía server của upload session: ghép chunk theo offset; fail_append={lượt gọi: lỗi}."""
+
+    def __init__(self, fail_append=None):
+        self.data = bytearray()
+        self.commit = None
+        self.appends = 0
+        self.fail_append = dict(fail_append or {})
+
+    def _incorrect_offset(self, cursor, error):
+        if cursor.offset != len(self.data):
+            raise ApiError("req", error(dbx_files.UploadSessionOffsetError(correct_offset=len(self.data))), None, None)
+
+    def files_upload_session_start(self, chunk):
+        self.data += chunk
+        return SimpleNamespace(session_id="phien-1")
+
+    def files_upload_session_append_v2(self, chunk, cursor):
+        self.appends += 1
+        fault = self.fail_append.pop(self.appends, None)
+        if fault == "lost":
+            # Đứt mạng trước khi chunk tới server
+            raise requests.exceptions.ConnectionError("đứt kết nối")
+        self._incorrect_offset(cursor, dbx_files.UploadSessionAppendError.incorrect_offset)
+        self.data += chunk
+        if fault == "no_reply":
+            # Server đã nhận chunk nhưng phản hồi bị mất
+            raise requests.exceptions.ReadTimeout("mất phản hồi")
+
+    def files_upload_session_finish(self, chunk, cursor, commit):
+        self._incorrect_offset(
+            cursor,
+            lambda e: dbx_files.UploadSessionFinishError.lookup_failed(
+                dbx_files.UploadSessionLookupError.incorrect_offset(e)
+            ),
+        )
+        self.data += chunk
+        self.commit = commit
+        return SimpleNamespace(path_display=commit.path)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(upload_to_dropbox.time, "sleep", lambda s: None)
+
+
+def _upload(dbx, payload, chunk_size=4):
+    commit = dbx_files.CommitInfo(path="/van_ban/a.pdf", mode=dbx_files.WriteMode.add, autorename=True)
+    with upload_to_dropbox._open_source(payload) as (f, size):
+        return upload_to_dropbox._upload_session(dbx, f, size, commit, chunk_size), commit
+
+
+def test_append_lost_mid_stream_is_resent():
+    payload = os.urandom(18)
+    dbx = FakeSessionDropbox(fail_append={2: "lost"})
+    meta, commit = _upload(dbx, payload)
+    assert bytes(dbx.data) == payload
+    assert dbx.commit is commit and meta.path_display == "/van_ban/a.pdf"
+
+
+def test_resumes_from_server_offset_when_chunk_already_arrived():
+    payload = os.urandom(18)
+    dbx = FakeSessionDropbox(fail_append={2: "no_reply"})
+    meta, commit = _upload(dbx, payload)
+    # Lần gửi lại bị báo incorrect_offset -> đọc tiếp từ offset server, không ghi trùng chunk
+    assert bytes(dbx.data) == payload
+    assert dbx.commit is commit and meta.path_display == "/van_ban/a.pdf"
+
+
+def test_gives_up_after_chunk_retries():
+    dbx = FakeSessionDropbox(fail_append={n: "lost" for n in range(1, 10)})
+    with pytest.raises(requests.exceptions.ConnectionError):
+        _upload(dbx, os.urandom(18))
+    assert dbx.commit is None
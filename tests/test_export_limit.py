@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+import database
+import export_engine
+
+
+@pytest.fixture
+def small_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_engine, "EXPORT_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(export_engine, "EXPORT_MAX_MB", 1)
+    return tmp_path / "exports"
+
+
+def test_zip_over_cap_stops_and_leaves_no_file(env, small_cap):
+    store, db = env
+    for k in range(3):
+        path = store.upload(os.urandom(600 * 1024), f"f{k}.pdf")
+        database.insert_vanban({"tieu_de": f"vb {k}", "file_dinh_kem": path}, db)
+
+    with pytest.raises(RuntimeError, match="EXPORT_MAX_MB"):
+        export_engine.export_attachments(database.VanbanFilter(), store.download, db_path=db)
+    assert os.listdir(small_cap) == []
+
+
+def test_read_export_refuses_file_over_cap(small_cap):
+    path = export_engine._temp_file("vanban_loc_", ".csv")
+    with open(path, "wb") as f:
+        f.write(b"x" * (1024 * 1024 + 1))
+    with pytest.raises(RuntimeError):
+        export_engine.read_export(path)
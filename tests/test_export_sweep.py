@@ -0,0 +1,15 @@
+import os
+import time
+
+import export_engine
+
+
+def test_sweep_removes_only_expired_exports(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_engine, "EXPORT_DIR", str(tmp_path))
+    old = export_engine._temp_file("vanban_loc_", ".csv")
+    new = export_engine._temp_file("vanban_loc_", ".csv")
+    expired = time.time() - export_engine.EXPORT_TTL - 10
+    os.utime(old, (expired, expired))
+
+    assert export_engine.sweep() == 1
+    assert not os.path.exists(old) and os.path.exists(new)
@@ -0,0 +1,88 @@
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+from dropbox import files as dbx_files
+
+import database
+import dropbox_sync
+
+
+def _row(db, vanban_id):
+    with database.get_conn(db) as conn:
+        return dict(conn.execute("SELECT * FROM vanban WHERE id = ?", (vanban_id,)).fetchone())
+
+
+def _add(db, path, digest):
+    return database.insert_vanban({"tieu_de": path, "file_dinh_kem": path, "content_hash": digest}, db)
+
+
+def _file(path, digest):
+    return {"path_lower": path.lower(), "path_display": path, "size": 3, "rev": "015f00000001", "content_hash": digest}
+
+
+def test_rename_on_same_page_relinks(env):
+    _, db = env
+    vid = _add(db, "/van_ban/a.pdf", "h1")
+    stats = database.apply_file_changes([_file("/van_ban/moi/a.pdf", "h1")], ["/van_ban/a.pdf"], db_path=db)
+    row = _row(db, vid)
+    assert stats["relinked"] == 1 and stats["missing"] == 0
+    assert (row["file_dinh_kem"], row["file_key"], row["file_missing"]) == ("/van_ban/moi/a.pdf", "/van_ban/moi/a.pdf", 0)
+
+
+def test_new_copy_listed_first_does_not_take_row_of_existing_file(env):
+    _, db = env
+    vid = _add(db, "/van_ban/a.pdf", "h1")
+    files = [_file("/van_ban/0_ban_sao.pdf", "h1"), _file("/van_ban/a.pdf", "h1")]
+    stats = database.apply_file_changes(files, [], folder_key="/van_ban", db_path=db)
+    assert stats["relinked"] == 0
+    assert _row(db, vid)["file_dinh_kem"] == "/van_ban/a.pdf"
+
+
+def _meta(path, digest):
+    now = datetime(2024, 1, 1)
+    return dbx_files.FileMetadata(
+        name=os.path.basename(path), id="id:" + digest[:8], client_modified=now, server_modified=now,
+        rev="015f00000001", size=3, path_lower=path.lower(), path_display=path, content_hash=digest,
+    )
+
+
+class _PagedDropbox:
+    """files_list_folder_continue trả về lần lượt các trang cho sẵn."""
+
+    def __init__(self, pages):
+        self._pages = list(pages)
+
+    def files_list_folder_continue(self, cursor):
+        entries = self._pages.pop(0)
+        return SimpleNamespace(entries=entries, has_more=bool(self._pages), cursor=f"c{len(self._pages)}")
+
+
+def test_rename_across_pages_relinks_when_delete_comes_later(env, monkeypatch):
+    _, db = env
+    digest = "ab" * 32
+    vid = _add(db, "/van_ban/a.pdf", digest)
+    database.set_meta(dropbox_sync._cursor_key("/van_ban"), "c-truoc", db_path=db)
+    pages = [
+        [_meta("/van_ban/moi/a.pdf", digest)],
+        [dbx_files.DeletedMetadata(name="a.pdf", path_lower="/van_ban/a.pdf", path_display="/van_ban/a.pdf")],
+    ]
+    monkeypatch.setattr(dropbox_sync, "_get_dbx", lambda: _PagedDropbox(pages))
+
+    res = dropbox_sync.sync_folder("/van_ban", db_path=db)
+    row = _row(db, vid)
+    assert res["relinked"] == 1 and res["missing"] == 0 and not res["full"]
+    assert (row["file_dinh_kem"], row["file_missing"]) == ("/van_ban/moi/a.pdf", 0)
+
+
+def test_full_resync_marks_deleted_file_missing(env):
+    store, db = env
+    kept = store.upload(b"con", "a.pdf")
+    gone = store.upload(b"mat", "b.pdf")
+    kept_id, gone_id = _add(db, kept, None), _add(db, gone, None)
+    os.remove(store._local(gone))
+
+    res = store.sync(db_path=db)
+    assert res["missing"] == 1 and res["full"]
+    assert _row(db, gone_id)["file_missing"] == 1
+    assert _row(db, kept_id)["file_missing"] == 0
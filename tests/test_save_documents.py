@@ -0,0 +1,54 @@
+import pytest
+
+from drive_sheets import APPEND_RETRIES, SheetAppender, save_documents
+from fakes import FakeError, FakeGoogle, FaultInjector
+
+
+def _docs(n):
+    return [
+        {"source": b"pdf", "name": f"vb_{k}.pdf", "mimetype": "application/pdf", "row": [f"{k}/QD", f"Văn bản {k}", "", ""]}
+        for k in range(n)
+    ]
+
+
+def test_rows_are_written_when_share_batch_fails():
+    g = FakeGoogle(FaultInjector(fail_ops={"batch"}))
+    saved, errors, private = save_documents(g.drive, g.sheets, "folder", g.sheet_id, _docs(3))
+
+    assert saved == 3 and not errors
+    assert len(g.files) == 3
+    assert [r[-1] for r in g.rows] == list(g.files)
+    assert sorted(private) == ["vb_0.pdf", "vb_1.pdf", "vb_2.pdf"]
+    assert not any(f["public"] for f in g.files.values())
+
+
+def test_rows_of_uploaded_files_are_written_when_loop_is_interrupted():
+    g = FakeGoogle()
+
+    def _stop(done, total, name, err):
+        if done == 2:
+            raise KeyboardInterrupt
+
+    try:
+        save_documents(g.drive, g.sheets, "folder", g.sheet_id, _docs(3), on_progress=_stop)
+    except KeyboardInterrupt:
+        pass
+    assert [r[-1] for r in g.rows] == list(g.files) and len(g.rows) == 2
+
+
+def test_failed_append_is_retried_then_reported():
+    g = FakeGoogle(FaultInjector(fail_ops={"sheets.append"}))
+    with pytest.raises(FakeError):
+        save_documents(g.drive, g.sheets, "folder", g.sheet_id, _docs(2))
+    assert g.faults.calls["sheets.append"] == 1 + APPEND_RETRIES
+    assert not g.rows
+
+
+def test_appender_keeps_rows_after_failed_flush():
+    g = FakeGoogle(FaultInjector(fail_ops={"sheets.append"}))
+    appender = SheetAppender(g.sheets, g.sheet_id)
+    appender.add(["1"])
+    with pytest.raises(FakeError):
+        appender.flush()
+    g.faults.fail_ops.clear()
+    assert appender.flush() == 1 and g.rows == [["1"]]
@@ -0,0 +1,21 @@
+from drive_sheets import SheetCache, read_sheet_values
+from fakes import FakeGoogle
+
+
+def test_read_continues_past_blank_rows_at_block_boundary():
+    g = FakeGoogle()
+    # batch_rows=3: dòng 4-6 (cả 1 range) trống, dòng 3 trống ở cuối range đầu
+    g.rows = [["so", "tieu_de"], ["1", "a"], [], [], [], [], ["2", "b"], ["3", "c"]]
+    header, rows = read_sheet_values(g.sheets, g.drive, g.sheet_id, SheetCache(), batch_rows=3, ranges_per_call=2)
+    assert header == ["so", "tieu_de"]
+    assert rows == g.rows[1:]
+
+
+def test_incremental_read_keeps_row_positions_after_blank_rows():
+    g = FakeGoogle()
+    g.rows = [["so"], ["1"], [], [], ["2"]]
+    cache = SheetCache()
+    read_sheet_values(g.sheets, g.drive, g.sheet_id, cache, batch_rows=2, ranges_per_call=2)
+    g._append(g.sheet_id, "A1", {"values": [["3"]]}).execute()
+    _, rows = read_sheet_values(g.sheets, g.drive, g.sheet_id, cache, batch_rows=2, ranges_per_call=2)
+    assert rows == [["1"], [], [], ["2"], ["3"]]
@@ -0,0 +1,38 @@
+import os
+
+import database
+
+
+def _save(store, db, data, name):
+    path, digest, reused = store.store(data, name, db_path=db)
+    vanban_id = database.insert_vanban({"tieu_de": name, "file_dinh_kem": path, "content_hash": digest}, db)
+    return vanban_id, path, reused
+
+
+def test_store_reuses_file_of_live_row(env):
+    store, db = env
+    _, first, _ = _save(store, db, b"noi dung", "a.pdf")
+    _, second, reused = _save(store, db, b"noi dung", "b.pdf")
+    assert reused and second == first
+
+
+def test_delete_then_reupload_uploads_again(env):
+    store, db = env
+    vanban_id, path, _ = _save(store, db, b"noi dung", "a.pdf")
+    database.delete_vanban(vanban_id, db)
+    assert database.compact(store.delete, db_path=db) == 1
+    assert not os.path.exists(store._local(path))
+
+    _, new_path, reused = _save(store, db, b"noi dung", "a.pdf")
+    assert not reused
+    assert os.path.isfile(store._local(new_path))
+
+
+def test_compact_keeps_file_shared_with_live_row(env):
+    store, db = env
+    first_id, path, _ = _save(store, db, b"dung chung", "a.pdf")
+    _save(store, db, b"dung chung", "b.pdf")
+    database.delete_vanban(first_id, db)
+    assert database.compact(store.delete, db_path=db) == 1
+    assert os.path.isfile(store._local(path))
+
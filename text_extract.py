@@ -0,0 +1,76 @@
+# text_extract.py
+"""
+Trích nội dung chữ của file đính kèm để tìm kiếm toàn văn (chạy trong tiến
+trình con của text_index, nên chỉ dùng thư viện chuẩn + pypdf):
+- PDF: pypdf (tuỳ chọn; chưa cài thì file PDF báo lỗi, trích lại sau bằng
+  `python text_index.py --retry-failed`)
+- DOCX: đọc thẳng word/document.xml (+ header / footer / chú thích) trong file zip
+Kết quả đã bỏ dấu (vn_text.fold), tối đa MAX_CHARS ký tự.
+"""
+import os
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+from vn_text import fold
+
+# Định dạng trích được (đuôi file, khớp cột vanban.ext)
+EXTENSIONS = ("pdf", "docx")
+# Giới hạn độ dài nội dung lưu cho mỗi file (văn bản rất dài chỉ lấy phần đầu)
+MAX_CHARS = int(os.environ.get("TEXT_MAX_CHARS", "200000"))
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_PARTS = re.compile(r"word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml")
+# Thẻ tách từ trong DOCX: hết đoạn, tab, xuống dòng
+_DOCX_BREAKS = {_W + "p", _W + "tab", _W + "br", _W + "cr"}
+
+
+def _docx_text(path: str) -> str:
+    parts, size = [], 0
+    with zipfile.ZipFile(path) as zf:
+        names = sorted(
+            (n for n in zf.namelist() if _DOCX_PARTS.fullmatch(n)),
+            key=lambda n: n != "word/document.xml",  # thân văn bản trước
+        )
+        for name in names:
+            with zf.open(name) as f:
+                for _, el in iterparse(f):
+                    if el.tag == _W + "t" and el.text:
+                        parts.append(el.text)
+                        size += len(el.text)
+                    elif el.tag in _DOCX_BREAKS:
+                        parts.append(" ")
+                        if el.tag == _W + "p":
+                            el.clear()  # đoạn đã đọc xong -> giải phóng bộ nhớ
+                    if size >= MAX_CHARS:
+                        return "".join(parts)
+    return "".join(parts)
+
+
+def _pdf_text(path: str) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("Chưa cài pypdf (pip install pypdf), bỏ qua file PDF")
+    parts, size = [], 0
+    for page in PdfReader(path).pages:
+        text = page.extract_text() or ""
+        parts.append(text)
+        size += len(text)
+        if size >= MAX_CHARS:
+            break
+    return " ".join(parts)
+
+
+_EXTRACTORS = {"pdf": _pdf_text, "docx": _docx_text}
+
+
+def extract_text(path: str, ext: str) -> str:
+    """
+    Nội dung chữ (đã bỏ dấu) của file `path` theo định dạng `ext` ("pdf" / "docx").
+    `path` có thể không có đuôi (file trong blob_cache) nên định dạng truyền riêng.
+    """
+    extractor = _EXTRACTORS.get(ext.lower().lstrip("."))
+    if extractor is None:
+        raise ValueError(f"Không trích được nội dung file .{ext}")
+    return fold(extractor(path))[:MAX_CHARS]
@@ -0,0 +1,154 @@
+# text_index.py
+"""
+Lập chỉ mục nội dung file đính kèm (PDF / DOCX) cho tìm kiếm toàn văn.
+
+- Lấy các văn bản chưa trích / file đã đổi (database.pending_content), tải file
+  qua storage (bản trong blob_cache nếu đã có), trích chữ trong tiến trình con
+  (ProcessPoolExecutor, không chiếm GIL của app) rồi ghi vào cột content_text;
+  chỉ mục FTS cập nhật qua trigger. Lúc tìm kiếm không phải tải lại file.
+- TextIndexer: thread nền trong app, chạy khi có file mới (wake) hoặc định kỳ.
+- Chạy tay (trích cho các file Dropbox đã có từ trước):
+      python text_index.py [--workers 4] [--batch 100] [--retry-failed | --force]
+"""
+import os
+import sys
+import argparse
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import database
+import metrics
+import text_extract
+
+# Số tiến trình trích nội dung, số văn bản mỗi lô, chu kỳ quét định kỳ (giây)
+TEXT_WORKERS = int(os.environ.get("TEXT_WORKERS", str(min(2, os.cpu_count() or 1))))
+BATCH_SIZE = int(os.environ.get("TEXT_BATCH_SIZE", "50"))
+TEXT_INDEX_INTERVAL = int(os.environ.get("TEXT_INDEX_INTERVAL", "600"))
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # "spawn": tiến trình con sạch, không kế thừa thread / khóa của Streamlit
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def index_pending(
+    download,
+    workers: int = TEXT_WORKERS,
+    batch_size: int = BATCH_SIZE,
+    db_path: str | None = None,
+    on_progress=None,
+) -> dict:
+    """
+    Trích nội dung cho mọi văn bản đang chờ, theo lô tới khi hết.
+    - download(path) -> đường dẫn file cục bộ (Storage.download)
+    - on_progress(stats) sau mỗi lô
+    File trích lỗi vẫn được đánh dấu (content_text NULL) để không lặp lại mãi;
+    xem database.reset_content để trích lại.
+    Trả về {"indexed": số file trích được, "failed": số file lỗi}.
+    """
+    stats = {"indexed": 0, "failed": 0}
+    pool = _new_pool(workers)
+    try:
+        while True:
+            rows = database.pending_content(text_extract.EXTENSIONS, limit=batch_size, db_path=db_path)
+            if not rows:
+                return stats
+            # Tải file (I/O) trong thread này trong khi tiến trình con trích các file trước
+            jobs = []
+            for r in rows:
+                try:
+                    with metrics.span("text.download"):
+                        local = download(r["file_dinh_kem"])
+                    jobs.append((r, pool.submit(text_extract.extract_text, local, r["ext"])))
+                except Exception as e:
+                    jobs.append((r, e))
+
+            results, broken = [], False
+            for r, job in jobs:
+                try:
+                    if isinstance(job, Exception):
+                        raise job
+                    text = job.result()
+                    stats["indexed"] += 1
+                except Exception as e:
+                    broken = broken or isinstance(e, BrokenProcessPool)
+                    print(f"[text_index] {r['file_dinh_kem']}: {e}", file=sys.stderr)
+                    text = None
+                    stats["failed"] += 1
+                results.append((r["id"], text, r["file_version"]))
+            database.set_content(results, db_path=db_path)
+            metrics.count("text_files", len(results))
+            if broken:
+                # 1 file làm chết tiến trình con -> tạo pool mới cho các lô sau
+                pool.shutdown(cancel_futures=True)
+                pool = _new_pool(workers)
+            if on_progress:
+                on_progress(dict(stats))
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+class TextIndexer(threading.Thread):
+    """Thread nền gọi index_pending khi có file mới (wake) hoặc định kỳ."""
+
+    def __init__(self, download, interval: int = TEXT_INDEX_INTERVAL, db_path: str | None = None):
+        super().__init__(name="vanban-text-index", daemon=True)
+        self._download = download
+        self._interval = interval
+        self._db_path = db_path
+        self._wake = threading.Event()
+
+    def wake(self) -> None:
+        """Yêu cầu trích ngay (gọi sau khi lưu văn bản / đồng bộ)."""
+        self._wake.set()
+
+    def run(self) -> None:
+        while True:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                # Không có file chờ thì không tạo tiến trình con
+                if database.pending_content(text_extract.EXTENSIONS, limit=1, db_path=self._db_path):
+                    with metrics.span("text.index_pending"):
+                        index_pending(self._download, db_path=self._db_path)
+            except Exception:
+                traceback.print_exc()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=TEXT_WORKERS)
+    ap.add_argument("--batch", type=int, default=BATCH_SIZE)
+    again = ap.add_mutually_exclusive_group()
+    again.add_argument("--retry-failed", action="store_true", help="trích lại các file trước đó bị lỗi")
+    again.add_argument("--force", action="store_true", help="trích lại toàn bộ")
+    ap.add_argument("--db", help="file SQLite (mặc định VANBAN_DB / vanban.db)")
+    args = ap.parse_args()
+
+    from storage import get_storage
+
+    database.init_db(args.db)
+    if args.force or args.retry_failed:
+        n = database.reset_content(failed_only=args.retry_failed, db_path=args.db)
+        print(f"Đánh dấu trích lại {n} văn bản")
+
+    def _on_progress(stats):
+        print(f"  đã trích {stats['indexed']} file, lỗi {stats['failed']}", flush=True)
+
+    stats = index_pending(
+        get_storage().download, workers=args.workers, batch_size=args.batch,
+        db_path=args.db, on_progress=_on_progress,
+    )
+    total = database.content_stats(args.db)
+    print(
+        f"Xong: trích {stats['indexed']} file, lỗi {stats['failed']}. "
+        f"Đã có nội dung {total['indexed']}/{total['files']} văn bản có file."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,55 +1,33 @@
-import json
 import streamlit as st
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+
+from drive_sheets import share_anyone_reader, upload_file
+from google_clients import drive_service
 
 # Folder ID của bạn
 FOLDER_ID = "0B85NRfuypJmeZWRYcXY3czdXcVk"  # giữ nguyên ID này
 
-def upload_file_to_drive(file_path, file_name):
-    SCOPES = ['https://www.googleapis.com/auth/drive']
-
-    # Đọc credentials từ secrets
-    creds_info = json.loads(st.secrets["GOOGLE_CREDENTIALS"])
-    creds = service_account.Credentials.from_service_account_info(
-        creds_info, scopes=SCOPES
-    )
-
-    service = build("drive", "v3", credentials=creds)
-
-    file_metadata = {
-        "name": file_name,
-        "parents": [FOLDER_ID]
-    }
+def upload_file_to_drive(source, file_name, mimetype=None):
+    """
+    Upload lên folder chia sẻ, trả về link xem.
+    - source: đường dẫn file, bytes hoặc file-like (UploadedFile ...) – không cần ghi file tạm
+    Client Drive dùng chung (google_clients): không build lại service / xin token mỗi lần.
+    """
+    service = drive_service()
 
-    media = MediaFileUpload(file_path, resumable=True)
-
-    uploaded_file = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields="id",
-        supportsAllDrives=True
-    ).execute()
-
-    file_id = uploaded_file.get("id")
+    file_id, link = upload_file(service, FOLDER_ID, source, file_name, mimetype)
 
     # Tạo quyền xem công khai
-    permission = {
-        "type": "anyone",
-        "role": "reader"
-    }
-    service.permissions().create(fileId=file_id, body=permission).execute()
+    errors = share_anyone_reader(service, [file_id])
+    if errors:
+        raise errors[file_id]
 
-    return f"https://drive.google.com/file/d/{file_id}/view"
+    return link
 
 # Ví dụ chạy test trong Streamlit
 st.title("Upload file lên Google Drive folder chia sẻ")
 
 uploaded = st.file_uploader("Chọn file", type=["pdf", "docx", "xlsx"])
 if uploaded:
-    with open(uploaded.name, "wb") as f:
-        f.write(uploaded.getbuffer())
-
-    link = upload_file_to_drive(uploaded.name, uploaded.name)
+    # Stream thẳng từ buffer của UploadedFile (không ghi ra thư mục làm việc)
+    link = upload_file_to_drive(uploaded, uploaded.name, uploaded.type)
     st.success(f"Upload thành công! [Mở file]({link})")
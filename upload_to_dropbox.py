@@ -1,18 +1,68 @@
 # upload_to_dropbox.py
+import io
 import os
+import time
+import threading
 import dropbox
+import requests
 import streamlit as st
+from contextlib import contextmanager
 from dropbox import files as dbx_files
-from dropbox.exceptions import ApiError
+from dropbox.dropbox_client import create_session
+from dropbox.exceptions import ApiError, InternalServerError
+
+import blob_cache
+import metrics
+from common import setting
 
 # Thư mục mặc định (đúng tên như trên Dropbox, không dùng %20)
 DEFAULT_FOLDER = "/Quan/Quan ly van ban/Van ban dieu hanh, chi dao"
 
+# Upload theo phiên (chunk) cho file lớn: files_upload chỉ nhận tối đa 150MB/lần
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Số lần thử lại 1 chunk lỗi mạng trước khi bỏ cuộc
+CHUNK_RETRIES = 3
+
+# 1 client dùng chung cho cả tiến trình (mọi phiên Streamlit, mọi thread):
+# giữ kết nối HTTP keep-alive, không bắt tay TLS lại ở mỗi lần gọi.
+_DBX_CLIENT: dropbox.Dropbox | None = None
+_DBX_LOCK = threading.Lock()
+
+
+class _MeteredDropbox(dropbox.Dropbox):
+    """Dropbox client đếm từng lệnh gọi API (theo route) và số byte gửi lên (metrics)."""
+
+    def request(self, route, namespace, request_arg, request_binary, timeout=None, **kwargs):
+        metrics.count("api_calls", service="dropbox", op=f"{namespace}/{route.name}")
+        if request_binary:
+            metrics.count("bytes_up", len(request_binary), service="dropbox")
+        return super().request(route, namespace, request_arg, request_binary, timeout=timeout, **kwargs)
+
 
 def _get_dbx() -> dropbox.Dropbox:
-    """Khởi tạo client Dropbox từ secrets hoặc biến môi trường."""
-    token = os.environ.get("DROPBOX_ACCESS_TOKEN") or st.secrets["DROPBOX_ACCESS_TOKEN"]
-    return dropbox.Dropbox(token)
+    """
+    Client Dropbox dùng chung (tạo 1 lần, an toàn đa luồng).
+    Cấu hình (env hoặc secrets):
+    - DROPBOX_POOL_SIZE: số kết nối tối đa trong pool (mặc định 8)
+    - DROPBOX_MAX_RETRIES: số lần thử lại khi lỗi 5xx (mặc định 4, backoff tăng dần)
+    - DROPBOX_RATE_LIMIT_RETRIES: số lần thử lại khi bị giới hạn tốc độ
+      (mặc định 8, chờ theo Retry-After của Dropbox)
+    - DROPBOX_TIMEOUT: timeout mỗi request, giây (mặc định 100)
+    """
+    global _DBX_CLIENT
+    if _DBX_CLIENT is None:
+        with _DBX_LOCK:
+            if _DBX_CLIENT is None:
+                token = os.environ.get("DROPBOX_ACCESS_TOKEN") or st.secrets["DROPBOX_ACCESS_TOKEN"]
+                session = create_session(max_connections=int(setting("DROPBOX_POOL_SIZE", 8)))
+                _DBX_CLIENT = _MeteredDropbox(
+                    token,
+                    session=session,
+                    max_retries_on_error=int(setting("DROPBOX_MAX_RETRIES", 4)),
+                    max_retries_on_rate_limit=int(setting("DROPBOX_RATE_LIMIT_RETRIES", 8)),
+                    timeout=float(setting("DROPBOX_TIMEOUT", 100)),
+                )
+    return _DBX_CLIENT
 
 
 def _ensure_folder(dbx: dropbox.Dropbox, folder_path: str) -> None:
@@ -29,14 +79,125 @@ def _ensure_folder(dbx: dropbox.Dropbox, folder_path: str) -> None:
             raise
 
 
-def upload_file_to_dropbox(file_path: str, file_name: str, dropbox_folder: str | None = None) -> str:
+def _chunk_size() -> int:
+    return int(setting("DROPBOX_CHUNK_SIZE", DEFAULT_CHUNK_SIZE))
+
+
+def _incorrect_offset(err) -> int | None:
+    """Lấy offset đúng từ lỗi append/finish (khi chunk trước đã tới server)."""
+    if isinstance(err, dbx_files.UploadSessionFinishError):
+        if not err.is_lookup_failed():
+            return None
+        err = err.get_lookup_failed()
+    if isinstance(err, (dbx_files.UploadSessionLookupError, dbx_files.UploadSessionAppendError)):
+        if err.is_incorrect_offset():
+            return err.get_incorrect_offset().correct_offset
+    return None
+
+
+def _upload_session(
+    dbx: dropbox.Dropbox,
+    f,
+    size: int,
+    commit: dbx_files.CommitInfo,
+    chunk_size: int,
+) -> dbx_files.FileMetadata:
+    """
+    Upload theo phiên: start -> append_v2 ... -> finish, mỗi lần 1 chunk
+    (bộ nhớ chỉ giữ 1 chunk, không phụ thuộc dung lượng file).
+    Chunk lỗi mạng được gửi lại; nếu server báo sai offset (chunk thực ra đã tới)
+    thì đọc lại file từ offset server trả về rồi tiếp tục.
+    """
+    # size > chunk_size nên chunk đầu (start) không bao giờ là chunk cuối
+    session_id = None
+    offset = 0
+    failures = 0
+    while True:
+        f.seek(offset)
+        chunk = f.read(chunk_size)
+        is_last = offset + len(chunk) >= size
+        try:
+            if session_id is None:
+                session_id = dbx.files_upload_session_start(chunk).session_id
+            else:
+                cursor = dbx_files.UploadSessionCursor(session_id=session_id, offset=offset)
+                if is_last:
+                    return dbx.files_upload_session_finish(chunk, cursor, commit)
+                dbx.files_upload_session_append_v2(chunk, cursor)
+            offset += len(chunk)
+            failures = 0
+        except ApiError as e:
+            correct = _incorrect_offset(e.error)
+            if correct is None or correct == offset:
+                raise
+            offset = correct
+        except (requests.exceptions.RequestException, InternalServerError):
+            if failures >= CHUNK_RETRIES:
+                raise
+            failures += 1
+            time.sleep(2 ** failures)
+
+
+class _BufferReader:
+    """Đọc 1 buffer (bytes/bytearray/memoryview) theo từng đoạn, không sao chép cả khối."""
+
+    def __init__(self, buf):
+        self._mv = memoryview(buf).cast("B")
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return len(self._mv)
+
+    def seek(self, pos: int) -> int:
+        self._pos = pos
+        return pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._mv) if size is None or size < 0 else self._pos + size
+        data = self._mv[self._pos:end].tobytes()
+        self._pos += len(data)
+        return data
+
+
+@contextmanager
+def _open_source(source):
+    """
+    Chuẩn hóa nguồn upload -> (file-like nhị phân, dung lượng), đọc từ đầu.
+    Nhận: đường dẫn file, bytes/bytearray/memoryview, hoặc file-like có seek
+    (ví dụ UploadedFile của st.file_uploader) -> đọc thẳng, không qua file tạm.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f, os.path.getsize(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        reader = _BufferReader(source)
+        yield reader, len(reader)
+    else:
+        size = source.seek(0, io.SEEK_END)
+        source.seek(0)
+        yield source, size
+
+
+@metrics.timed("dropbox.upload")
+def upload_file_to_dropbox(
+    source,
+    file_name: str,
+    dropbox_folder: str | None = None,
+    chunk_size: int | None = None,
+) -> str:
     """
     Upload file lên Dropbox.
+    - source: đường dẫn file, bytes/memoryview hoặc file-like (UploadedFile ...)
     - dropbox_folder: nếu None sẽ dùng DEFAULT_FOLDER
-    - Trả về: đường dẫn Dropbox (ví dụ: /Quan/.../tenfile.pdf)
+    - chunk_size: file lớn hơn mức này được upload theo phiên, từng chunk
+      (mặc định DROPBOX_CHUNK_SIZE hoặc 8MB)
+    - Trùng tên với file khác đã có -> Dropbox tự đổi tên ("tenfile (1).pdf"),
+      không ghi đè; trùng cả nội dung thì giữ nguyên file cũ
+    - Trả về: đường dẫn Dropbox thực tế (ví dụ: /Quan/.../tenfile.pdf)
     YÊU CẦU QUYỀN: files.content.write
     """
     dbx = _get_dbx()
+    chunk_size = chunk_size or _chunk_size()
 
     folder = (dropbox_folder or DEFAULT_FOLDER).strip()
     if not folder.startswith("/"):
@@ -47,38 +208,81 @@ def upload_file_to_dropbox(file_path: str, file_name: str, dropbox_folder: str |
 
     dropbox_path = f"{folder}/{file_name}"
 
-    with open(file_path, "rb") as f:
-        dbx.files_upload(
-            f.read(),
-            dropbox_path,
-            mode=dbx_files.WriteMode.overwrite,
-            mute=True,
-        )
+    with _open_source(source) as (f, size):
+        if size <= chunk_size:
+            meta = dbx.files_upload(
+                f.read(),
+                dropbox_path,
+                mode=dbx_files.WriteMode.add,
+                autorename=True,
+                mute=True,
+            )
+        else:
+            commit = dbx_files.CommitInfo(
+                path=dropbox_path,
+                mode=dbx_files.WriteMode.add,
+                autorename=True,
+                mute=True,
+            )
+            meta = _upload_session(dbx, f, size, commit, chunk_size)
 
-    return dropbox_path
+    return meta.path_display
 
 
-def download_bytes_from_dropbox(dropbox_path: str) -> bytes:
+@metrics.timed("dropbox.download")
+def download_file_from_dropbox(dropbox_path: str) -> str:
     """
-    Tải file từ Dropbox và trả về bytes để dùng với st.download_button.
+    Tải file về cache cục bộ (blob_cache) và trả về đường dẫn file trên đĩa.
+    - Kiểm tra bằng files_get_metadata (rẻ): content_hash đã có trong cache
+      thì dùng luôn, không tải lại nội dung.
+    - Chưa có: tải thẳng xuống đĩa (files_download_to_file), không giữ trong RAM.
     YÊU CẦU QUYỀN: files.content.read
     """
     dbx = _get_dbx()
     try:
-        _meta, res = dbx.files_download(dropbox_path)
-        return res.content
+        meta = dbx.files_get_metadata(dropbox_path)
+        if not isinstance(meta, dbx_files.FileMetadata):
+            raise RuntimeError(f"'{dropbox_path}' không phải là file.")
+        cached = blob_cache.get(meta.content_hash)
+        if cached:
+            return cached
+        tmp_path = blob_cache.temp_path()
+        try:
+            dbx.files_download_to_file(tmp_path, dropbox_path, rev=meta.rev)
+            metrics.count("bytes_down", meta.size, service="dropbox")
+            return blob_cache.put_file(meta.content_hash, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
     except ApiError as e:
         # Cho message dễ hiểu hơn khi path sai / không tồn tại
         raise RuntimeError(f"Không tải được file từ '{dropbox_path}': {e}")
 
 
-def delete_file_from_dropbox(dropbox_path: str) -> None:
+def download_bytes_from_dropbox(dropbox_path: str) -> bytes:
+    """
+    Tải file từ Dropbox và trả về bytes để dùng với st.download_button.
+    Đi qua cache cục bộ: mở lại file đã tải thì không gọi mạng để lấy nội dung.
+    YÊU CẦU QUYỀN: files.content.read
+    """
+    try:
+        return blob_cache.read_bytes(download_file_from_dropbox(dropbox_path))
+    except FileNotFoundError:
+        # File cache vừa bị dọn (LRU) giữa lúc kiểm tra và lúc đọc -> tải lại
+        return blob_cache.read_bytes(download_file_from_dropbox(dropbox_path))
+
+
+@metrics.timed("dropbox.delete")
+def delete_file_from_dropbox(dropbox_path: str, missing_ok: bool = False) -> None:
     """
     Xóa file trên Dropbox theo đường dẫn.
+    - missing_ok: file không còn trên Dropbox thì coi như đã xóa
     YÊU CẦU QUYỀN: files.content.write
     """
     dbx = _get_dbx()
     try:
         dbx.files_delete_v2(dropbox_path)
     except ApiError as e:
+        if missing_ok and "not_found" in str(e.error).lower():
+            return
         raise RuntimeError(f"Không xóa được file '{dropbox_path}': {e}")
@@ -0,0 +1,25 @@
+# vn_text.py
+import re
+import unicodedata
+
+# Dấu thanh/dấu phụ tiếng Việt sau khi tách NFD đều nằm trong khối này
+_COMBINING_MARKS = re.compile("[\u0300-\u036f]")
+# "đ/Đ" không tách được bằng NFD nên phải đổi riêng
+_D_TABLE = str.maketrans({"đ": "d", "Đ": "D"})
+_SPACES = re.compile(r"\s+")
+
+
+def fold(s) -> str:
+    """
+    Chuẩn hóa chuỗi để tìm kiếm không dấu:
+    "Quyết định Đất đai" -> "quyet dinh dat dai"
+    """
+    s = "" if s is None else str(s)
+    s = unicodedata.normalize("NFD", s.translate(_D_TABLE))
+    s = _COMBINING_MARKS.sub("", s)
+    return _SPACES.sub(" ", s).lower().strip()
+
+
+def search_terms(q: str) -> list[str]:
+    """Tách từ khóa người dùng nhập thành các từ đã chuẩn hóa (AND)."""
+    return [t for t in fold(q).split(" ") if t]